@@ -0,0 +1,601 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import json
+import random
+import socket
+import builtins
+import threading
+import tempfile
+import shutil
+import subprocess
+import argparse as ap
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import createPro
+
+VERSION = '0.2'
+SCRIPT = __file__
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+BASELINE_TOLERANCE = 0.25
+TIMED_KEYS = ('seconds', 'write_seconds', 'median_wall_ms')
+PLOT_FORMATS = ['.png', '.pdf', '.jpg', '.eps', '.txt', '.csv']
+BIBTEX = '@article{{{key},\n\ttitle = {{Synthetic entry {doi}}},\n\tdoi = {{{doi}}},\n\tyear = {{2020}}\n}}'
+
+def log(string, newline_before=False):
+    if newline_before:
+        sys.stderr.write('\n')
+    sys.stderr.write(f'LOG: {string}\n')
+
+class FileOperationCounter:
+    '''Count the calls of open and os.replace while the counter is active.
+
+    These are file operations of the Python code, not syscalls: buffered writes, closes and
+    calls from C extensions are not seen.'''
+
+    def __init__(self):
+        self.counts = {'open': 0, 'replace': 0}
+        self.originals = {}
+
+    def __enter__(self):
+        self.originals = {'open': builtins.open, 'replace': os.replace}
+
+        def countedOpen(*args, **kwargs):
+            self.counts['open'] += 1
+            return self.originals['open'](*args, **kwargs)
+
+        def countedReplace(*args, **kwargs):
+            self.counts['replace'] += 1
+            return self.originals['replace'](*args, **kwargs)
+
+        builtins.open = countedOpen
+        os.replace = countedReplace
+        return self
+
+    def __exit__(self, *exc):
+        builtins.open = self.originals['open']
+        os.replace = self.originals['replace']
+
+def makeDataset(root, name, scale=1.0, seed=0):
+    '''Create the synthetic dataset name below root and return its path.
+
+    wide -- one directory with many files
+    deep -- a chain of nested directories with a few files each
+    tiny -- many directories with many files of at most 64 bytes
+    huge -- a few sparse files of 256 MB
+
+    An existing dataset with the same name and scale is reused.'''
+    path = os.path.join(root, f'{name}_{scale:g}')
+    done = f'{path}.done'
+    if os.path.exists(done):
+        return path
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    rng = random.Random(seed)
+
+    def files(directory, count, size):
+        os.makedirs(directory, exist_ok=True)
+        for i in range(count):
+            with open(os.path.join(directory, f'file_{i:07d}.dat'), 'wb') as w:
+                w.write(os.urandom(size() if callable(size) else size))
+
+    if name == 'wide':
+        files(path, int(20000 * scale), 1024)
+    elif name == 'deep':
+        directory = path
+        for depth in range(int(200 * scale)):
+            directory = os.path.join(directory, f'level_{depth:03d}')
+            files(directory, 5, 1024)
+    elif name == 'tiny':
+        for i in range(int(500 * scale)):
+            files(os.path.join(path, f'dir_{i:05d}'), 100, lambda: rng.randint(0, 64))
+    elif name == 'huge':
+        os.makedirs(path)
+        for i in range(max(1, int(4 * scale))):
+            with open(os.path.join(path, f'huge_{i}.dat'), 'wb') as w:
+                w.truncate(256 * 1024 ** 2)
+    else:
+        raise ValueError(f'Unknown dataset {name}')
+
+    open(done, 'w').close()
+    return path
+
+def makePlots(root, scale=1.0, seed=0):
+    '''Create a tree of empty plot and data files below root and return its path.'''
+    path = os.path.join(root, f'plots_{scale:g}')
+    done = f'{path}.done'
+    if os.path.exists(done):
+        return path
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    rng = random.Random(seed)
+
+    for i in range(int(100 * scale)):
+        directory = os.path.join(path, f'experiment_{i:04d}', f'run_{rng.randint(0, 9)}')
+        os.makedirs(directory, exist_ok=True)
+        for j in range(50):
+            open(os.path.join(directory, f'figure_{j:03d}{rng.choice(PLOT_FORMATS)}'), 'w').close()
+    for j in range(50):
+        open(os.path.join(path, f'figure_{j:03d}{rng.choice(PLOT_FORMATS)}'), 'w').close()
+
+    open(done, 'w').close()
+    return path
+
+class DoiStub:
+    '''Local HTTP server answering DOI requests with synthetic bibtex, used in place of doi.org.
+
+    Every failures-th request is answered with 503, DOIs ending with "missing" with 404.'''
+
+    def __init__(self, failures=0, latency=0.0):
+        from http.server import ThreadingHTTPServer
+        from http.server import BaseHTTPRequestHandler
+
+        self.failures = failures
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    request = stub.requests
+                time.sleep(stub.latency)
+                doi = self.path.lstrip('/')
+                if doi.endswith('missing'):
+                    self.send_error(404)
+                    return
+                if stub.failures > 0 and request % stub.failures == 0:
+                    self.send_error(503)
+                    return
+                body = BIBTEX.format(key=doi.replace('/', '_'), doi=doi).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-bibtex')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def makeRemote(root, commits=0, blob_size=0):
+    '''Create a local bare git repository below root in place of a --git remote and return its file URL.
+
+    With commits > 0 the remote gets a history of commits commits, every commit replaces
+    a random blob of blob_size bytes, so the history is much larger than the last commit.'''
+    remote = tempfile.mkdtemp(prefix='remote_', dir=root)
+    bare = os.path.join(remote, 'bench', 'bench_project.git')
+    subprocess.run(['git', 'init', '--quiet', '--bare', bare], check=True)
+    # partial clones with --filter need the permission of the remote
+    subprocess.run(['git', '-C', bare, 'config', 'uploadpack.allowFilter', 'true'], check=True)
+    if commits > 0:
+        work = os.path.join(remote, 'work')
+        subprocess.run(['git', 'clone', '--quiet', bare, work], check=True, stderr=subprocess.DEVNULL)
+        for i in range(commits):
+            with open(os.path.join(work, 'history.txt'), 'a') as w:
+                w.write(f'commit {i}\n' * 100)
+            with open(os.path.join(work, 'blob.bin'), 'wb') as w:
+                w.write(os.urandom(blob_size))
+            subprocess.run(['git', '-C', work, 'add', 'history.txt', 'blob.bin'], check=True)
+            subprocess.run(['git', '-C', work, '-c', 'user.name=bench', '-c', 'user.email=bench@localhost', 'commit', '--quiet', '-m', f'commit {i}'], check=True)
+        subprocess.run(['git', '-C', work, 'push', '--quiet', 'origin', 'HEAD'], check=True)
+        shutil.rmtree(work)
+    return f'file://{bare}'
+
+def legacyWrite(string, *files):
+    '''Per-line writer of createPro <= 0.5, kept as reference.'''
+    for file in files:
+        with open(file, 'a+') as w:
+            w.write(string + '\n')
+
+def benchWriter(args):
+    '''Write the README data tree of a link with args.files files line by line and buffered and count the file operations.'''
+    lines = [f'``|--> /res/data/file_{i:07d}.txt{"." * 20}1.0 KB``<br>' for i in range(args.files)]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        readmemd = os.path.join(tmp, 'legacy.md')
+        with FileOperationCounter() as counter:
+            start = time.perf_counter()
+            for line in lines:
+                legacyWrite(line, readmemd)
+            results['legacy'] = {'seconds': time.perf_counter() - start, 'file_operations': counter.counts}
+
+        readmemd = os.path.join(tmp, 'buffered.md')
+        with FileOperationCounter() as counter:
+            start = time.perf_counter()
+            docs = createPro.Documents()
+            for line in lines:
+                docs.write(line, readmemd)
+            docs.flush()
+            results['buffered'] = {'seconds': time.perf_counter() - start, 'file_operations': counter.counts}
+
+    return results
+
+def benchStartup(args):
+    '''Create a plain local project args.runs times in a new interpreter and measure the cold start.
+
+    The import time of createPro is read from python -X importtime.'''
+    results = {'wall_ms': [], 'import_ms': [], 'budget_ms': args.startup_budget}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.runs):
+            command = [sys.executable, '-X', 'importtime', createPro.__file__, '-p', os.path.join(tmp, f'project_{i}')]
+            start = time.perf_counter()
+            process = subprocess.run(command, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+            results['wall_ms'].append((time.perf_counter() - start) * 1000)
+
+            # cumulative import time of all top level imports in us
+            imports = 0
+            for line in process.stderr.splitlines():
+                if line.startswith('import time:') and not line.endswith('package'):
+                    cumulative, name = line.split('|')[1:]
+                    if not name.startswith('  '):
+                        imports += int(cumulative)
+            results['import_ms'].append(imports / 1000)
+
+    results['median_wall_ms'] = sorted(results['wall_ms'])[len(results['wall_ms']) // 2]
+    results['passed'] = results['median_wall_ms'] <= args.startup_budget
+    return results
+
+def benchStrategies(args):
+    '''Link args.strategy_files files of args.strategy_size bytes from args.src_dir to args.dst_dir with every link strategy.
+
+    Put src_dir and dst_dir on different filesystems, e.g. a tmpfs or loopback mount, to compare the fallbacks.'''
+    results = {}
+    src = tempfile.mkdtemp(prefix='bench_src_', dir=args.src_dir)
+    dst = tempfile.mkdtemp(prefix='bench_dst_', dir=args.dst_dir)
+    try:
+        data = os.urandom(args.strategy_size)
+        for i in range(args.strategy_files):
+            with open(os.path.join(src, f'file_{i:07d}'), 'wb') as w:
+                w.write(data)
+
+        for strategy in ['auto'] + list(createPro.LINK_FUNCTIONS.keys()):
+            linker = createPro.Linker(strategy)
+            start = time.perf_counter()
+            try:
+                for record in createPro.linkFiles(src, os.path.join(dst, strategy), linker=linker):
+                    pass
+                results[strategy] = {'seconds': time.perf_counter() - start, 'files': dict((name, count) for name, count in linker.counts.items() if count > 0), 'copied_bytes': linker.copied}
+            except createPro.CreateProError:
+                results[strategy] = {'error': 'not supported from {} to {}'.format(args.src_dir, args.dst_dir)}
+    finally:
+        shutil.rmtree(src)
+        shutil.rmtree(dst)
+
+    return results
+
+def benchLink(args):
+    '''Link every synthetic dataset of args.datasets into a new project with linkAllFiles and write README.md.'''
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.src_dir) as tmp:
+        for name in args.datasets:
+            walkpath = makeDataset(args.data_dir or tmp, name, scale=args.scale)
+            project_dir = os.path.join(tmp, f'project_{name}')
+            readmemd = os.path.join(project_dir, 'README.md')
+            os.makedirs(os.path.join(project_dir, 'res'))
+            docs = createPro.Documents()
+
+            start = time.perf_counter()
+            files, folders, size = createPro.linkAllFiles(docs=docs, project_dir=project_dir, readmemd=readmemd, walkpath=walkpath, dst=os.path.join(project_dir, 'res'), jobs=args.jobs, checksums=args.checksums)
+            seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            docs.flush()
+            results[name] = {'seconds': seconds, 'write_seconds': time.perf_counter() - start, 'files': files, 'folders': folders, 'bytes': size}
+            shutil.rmtree(project_dir)
+    return results
+
+def benchPlots(args):
+    '''Collect the plots of a synthetic plot tree with plindocs.getPlots and write them into README.md and attachments.tex.'''
+    import plindocs
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        plotdir = makePlots(args.data_dir or tmp, scale=args.scale)
+        os.makedirs(os.path.join(tmp, 'project', 'doc'))
+
+        start = time.perf_counter()
+        try:
+            plots = list(plindocs.getPlots(plotdir))
+        except Exception as e:
+            return {'getPlots': {'error': f'{type(e).__name__}: {e}'}}
+        results['getPlots'] = {'seconds': time.perf_counter() - start, 'files': len(plots)}
+
+        for name, docfile in (('markdown', {'md': True, 'tex': False}), ('latex', {'md': False, 'tex': True})):
+            for file in ('README.md', os.path.join('doc', 'attachments.tex')):
+                open(os.path.join(tmp, 'project', file), 'w').close()
+            docs = plindocs.Documents()
+            start = time.perf_counter()
+            rendered = plindocs.renderPlots(docs, plots, docfile, os.path.join(tmp, 'project'))
+            docs.flush()
+            results[name] = {'seconds': time.perf_counter() - start, 'plots': rendered}
+    return results
+
+def git(*args):
+    '''Run git with args and return its stripped output, None if git failed.'''
+    process = subprocess.run(['git'] + list(args), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    return process.stdout.strip() if process.returncode == 0 else None
+
+def checkGitProject(project, bare, before, clone):
+    '''Check the project created by createPro --git from the bare remote and return {check: passed}.
+
+    Keyword arguments:
+    project -- Path of the cloned project
+    bare -- Path of the bare remote
+    before -- Commit of the remote before the project was created, None for an empty remote
+    clone -- Clone arguments createPro was called with'''
+    head = git('-C', project, 'rev-parse', 'HEAD')
+    committed = set((git('-C', project, 'show', '--name-only', '--format=', 'HEAD') or '').splitlines())
+    latex = set(os.path.relpath(os.path.join(reldir, file), os.path.join(createPro.TEMPLATE_DIR, createPro.TEMPLATE, 'latex'))
+                for reldir, dirs, files in os.walk(os.path.join(createPro.TEMPLATE_DIR, createPro.TEMPLATE, 'latex')) for file in files)
+
+    checks = {}
+    # the clone arguments took effect
+    checks['shallow'] = git('-C', project, 'rev-parse', '--is-shallow-repository') == ('true' if '--depth' in clone else 'false')
+    if '--filter' in clone:
+        checks['partial'] = git('-C', project, 'config', 'remote.origin.partialclonefilter') == clone[clone.index('--filter') + 1]
+    # the scaffold is exactly one commit on top of the remote and was pushed
+    if before is None:
+        checks['one_commit'] = git('-C', project, 'rev-list', '--count', 'HEAD') == '1'
+    else:
+        checks['one_commit'] = git('-C', project, 'rev-parse', 'HEAD^') == before
+    checks['clean'] = git('-C', project, 'status', '--porcelain') == ''
+    checks['pushed'] = head is not None and git('-C', bare, 'rev-parse', 'HEAD') == head
+    # the commit holds the generated files
+    checks['readme'] = {'README.md', 'README.sh'} <= committed
+    checks['gitignore'] = '.gitignore' in committed
+    checks['latex'] = len(latex) > 0 and latex <= committed
+    return checks
+
+def benchGit(args):
+    '''Create projects with --git against a local bare repository, empty and with a long history of large blobs cloned full, shallow and partial.
+
+    Every project is checked: --depth gives a shallow and --filter a partial clone, the scaffold is one pushed commit
+    on top of the remote and contains README.md, README.sh, .gitignore and the latex files.'''
+    # createPro needs GitPython for --git
+    import importlib.util
+
+    if importlib.util.find_spec('git') is None:
+        return {'error': 'GitPython is not installed'}
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        history = makeRemote(tmp, args.git_commits, args.git_blob_size)
+        for name, url, clone in (('empty', makeRemote(tmp), []), ('history', history, []), ('shallow', history, ['--depth', '1']), ('partial', history, ['--filter', 'blob:none'])):
+            bare = url[len('file://'):]
+            before = git('-C', bare, 'rev-parse', '--verify', '--quiet', 'HEAD')
+            workdir = tempfile.mkdtemp(prefix='work_', dir=tmp)
+            profile = os.path.join(workdir, 'profile.json')
+            start = time.perf_counter()
+            subprocess.run([sys.executable, createPro.__file__, '-g', url, '-tex', '-i', 'temp/*', '--profile', profile] + clone, cwd=workdir, stderr=subprocess.DEVNULL, check=True)
+            results[name] = {'seconds': time.perf_counter() - start, 'commits': args.git_commits if url == history else 0, 'clone': ' '.join(clone)}
+            with open(profile) as r:
+                results[name]['phases'] = dict((phase, times['seconds']) for phase, times in json.load(r)['phases'].items())
+            results[name]['checks'] = checkGitProject(os.path.join(workdir, os.path.basename(bare)), bare, before, clone)
+            if not all(results[name]['checks'].values()):
+                log(f'Git project {name} failed the checks ' + ', '.join(check for check, passed in results[name]['checks'].items() if not passed))
+
+    results['passed'] = all(all(result['checks'].values()) for result in results.values())
+    return results
+
+def benchLibrary(args):
+    '''Create args.library_projects projects concurrently with createProject in one process, on their own paths and all on the same path.
+
+    Every project links the tiny dataset. Of the calls for the same path exactly one has to create the project,
+    all others have to fail with CreateProError code 1 without touching it.'''
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        walkpath = makeDataset(args.data_dir or tmp, 'tiny', scale=args.scale * 0.1)
+
+        def create(path, outcomes):
+            try:
+                createPro.createProject({'project': path, 'link': walkpath})
+                outcomes.append(0)
+            except createPro.CreateProError as e:
+                outcomes.append(e.code)
+            except BaseException as e:
+                log(f'createProject raised {e!r} instead of a CreateProError')
+                outcomes.append(None)
+
+        for name, paths in (('own', [os.path.join(tmp, f'project_{i}') for i in range(args.library_projects)]), ('same', [os.path.join(tmp, 'project_same')] * args.library_projects)):
+            outcomes = []
+            threads = [threading.Thread(target=create, args=(path, outcomes)) for path in paths]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[name] = {'seconds': time.perf_counter() - start, 'projects': len(paths), 'created': outcomes.count(0)}
+            if name == 'own':
+                results[name]['checks'] = {'created': outcomes.count(0) == len(paths),
+                                           'readme': all(os.path.isfile(os.path.join(path, 'README.md')) for path in paths)}
+            else:
+                results[name]['checks'] = {'created': outcomes.count(0) == 1,
+                                           'exists': outcomes.count(1) == len(paths) - 1,
+                                           'readme': os.path.isfile(os.path.join(paths[0], 'README.md')),
+                                           'manifest': os.path.isdir(os.path.join(paths[0], createPro.MANIFEST_DIR))}
+            if not all(results[name]['checks'].values()):
+                log(f'Concurrent projects {name} failed the checks ' + ', '.join(check for check, passed in results[name]['checks'].items() if not passed))
+
+    results['passed'] = all(all(result['checks'].values()) for result in results.values())
+    return results
+
+def benchDoi(args):
+    '''Resolve args.dois DOIs against a local HTTP stub in place of doi.org, uncached, cached and from a bibtex export with duplicates.'''
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        doifile = os.path.join(tmp, 'dois.txt')
+        with open(doifile, 'w') as w:
+            for i in range(args.dois):
+                w.write(f'10.5555/bench.{i}\n')
+
+        with DoiStub(failures=args.doi_failures, latency=args.doi_latency) as stub:
+            start = time.perf_counter()
+            with open(os.path.join(tmp, 'fetch.bib'), 'w') as bib:
+                entries, doiList = createPro.parseDoiToBib(doifile, True, jobs=args.doi_jobs, resolver=stub.url, bibFile=bib)
+            results['fetch'] = {'seconds': time.perf_counter() - start, 'dois': len(doiList), 'bibtex': entries, 'requests': stub.requests}
+
+            cache = createPro.DoiCache(os.path.join(tmp, 'cache.sqlite'))
+            createPro.parseDoiToBib(doifile, True, jobs=args.doi_jobs, resolver=stub.url, cache=cache)
+            requests = stub.requests
+            start = time.perf_counter()
+            createPro.parseDoiToBib(doifile, True, jobs=args.doi_jobs, resolver=stub.url, cache=cache)
+            results['cached'] = {'seconds': time.perf_counter() - start, 'requests': stub.requests - requests}
+            cache.close()
+
+            # bibtex export with every DOI twice, half of the entries only have a DOI and have to be resolved
+            bibfile = os.path.join(tmp, 'refs.bib')
+            with open(bibfile, 'w') as w:
+                for i in list(range(args.dois)) * 2:
+                    title = f'  title = {{Benchmark {i}}},\n' if i % 2 == 0 else ''
+                    w.write(f'@article{{bench{i},\n{title}  doi = {{10.5555/BENCH.{i}}}\n}}\n\n')
+            requests = stub.requests
+            start = time.perf_counter()
+            with open(os.path.join(tmp, 'ingest.bib'), 'w') as bib:
+                entries, doiList = createPro.parseDoiToBib(bibfile, True, jobs=args.doi_jobs, resolver=stub.url, bibFile=bib)
+            results['ingest'] = {'seconds': time.perf_counter() - start, 'entries': 2 * args.dois, 'dois': len(doiList), 'bibtex': entries, 'requests': stub.requests - requests}
+    return results
+
+def benchResmon(args):
+    '''Record a process tree of args.resmon_children busy children for args.resmon_seconds with resmon.Monitor
+    and check that the monitor needs less than resmon.MAX_OVERHEAD CPU.'''
+    import psutil
+    import resmon
+
+    # every child alternates between computing and sleeping, like a pipeline of workers
+    work = 'import time\nwhile True:\n    sum(range(100000))\n    time.sleep(0.01)\n'
+    with tempfile.TemporaryDirectory() as tmp:
+        recording = os.path.join(tmp, 'resmon.bin')
+        command = [sys.executable, '-c', f'import subprocess, sys\nfor p in [subprocess.Popen([sys.executable, "-c", {work!r}]) for i in range({args.resmon_children})]: p.wait()']
+        process = subprocess.Popen(command)
+        try:
+            with resmon.Monitor(recording, pids=[process.pid], interval=args.resmon_interval, command='benchmark'):
+                time.sleep(args.resmon_seconds)
+        finally:
+            for child in psutil.Process(process.pid).children(recursive=True):
+                child.kill()
+            process.kill()
+            process.wait()
+        summary = resmon.summarize(recording)
+
+    return {'samples': summary['samples'],
+            'interval': args.resmon_interval,
+            'cpu_average': summary['cpu_average'],
+            'monitor_cpu_seconds': summary['monitor_cpu'],
+            'overhead': summary['overhead'],
+            'passed': summary['overhead'] < resmon.MAX_OVERHEAD}
+
+BENCHMARKS = {'writer': benchWriter, 'startup': benchStartup, 'strategies': benchStrategies, 'link': benchLink, 'plots': benchPlots, 'git': benchGit, 'library': benchLibrary, 'doi': benchDoi, 'resmon': benchResmon}
+DATASETS = ['wide', 'deep', 'tiny', 'huge']
+
+def timings(results, prefix=''):
+    '''Yield (key, value) of all timings in results, key is the path of the timing joined by dots.'''
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from timings(value, f'{prefix}{key}.')
+        elif key in TIMED_KEYS and isinstance(value, (int, float)):
+            yield (f'{prefix}{key}', value)
+
+def compareBaseline(results, baseline, tolerance):
+    '''Compare the timings of results with baseline and return the regressions as {key: (baseline, current)}.
+
+    A timing regressed if it is more than tolerance slower than its baseline.'''
+    regressions = {}
+    for key, value in timings(results):
+        if key in baseline['timings'] and value > baseline['timings'][key] * (1 + tolerance):
+            regressions[key] = (baseline['timings'][key], value)
+    return regressions
+
+def parse_args(args):
+
+    parser = ap.ArgumentParser(
+        description=f'{SCRIPT} runs performance benchmarks for the sciProTools scripts.',
+        formatter_class=ap.HelpFormatter,
+        epilog=f'You are currently using {SCRIPT} version {VERSION}!'
+    )
+
+    parser.add_argument('benchmarks', metavar='BENCHMARK', nargs='*', default=list(BENCHMARKS.keys()), choices=list(BENCHMARKS.keys()), help=f'Benchmarks to run, choose from {", ".join(BENCHMARKS.keys())}. Default runs all.')
+    parser.add_argument('--files', metavar='N', default=100000, type=int, help='Number of linked files simulated by the writer benchmark. Default is 100000.')
+    parser.add_argument('--runs', metavar='N', default=5, type=int, help='Number of cold starts measured by the startup benchmark. Default is 5.')
+    parser.add_argument('--startup_budget', metavar='MS', default=150, type=float, help='Maximum median wall time of a cold start for a plain local project in ms. Default is 150.')
+    parser.add_argument('--src_dir', metavar='PATH', default=tempfile.gettempdir(), type=str, help='Directory the strategies benchmark links from. Default is the temporary directory.')
+    parser.add_argument('--dst_dir', metavar='PATH', default='/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), type=str, help='Directory the strategies benchmark links to. Default is /dev/shm if it exists.')
+    parser.add_argument('--strategy_files', metavar='N', default=1000, type=int, help='Number of files linked by the strategies benchmark. Default is 1000.')
+    parser.add_argument('--strategy_size', metavar='BYTES', default=64 * 1024, type=int, help='Size of the files linked by the strategies benchmark. Default is 65536.')
+    parser.add_argument('--datasets', metavar='DATASET', nargs='+', default=DATASETS, choices=DATASETS, help=f'Synthetic datasets linked by the link benchmark, choose from {", ".join(DATASETS)}. Default uses all.')
+    parser.add_argument('--scale', metavar='FACTOR', default=1.0, type=float, help='Scale the number of files of the synthetic datasets and plot trees. Default is 1.')
+    parser.add_argument('--data_dir', metavar='PATH', default=None, type=str, help='Keep the synthetic datasets in PATH and reuse them in later runs. Default creates them in a temporary directory.')
+    parser.add_argument('-j', '--jobs', metavar='N', default=None, type=int, help='Number of threads linking files in the link benchmark. Default is the createPro default.')
+    parser.add_argument('-cs', '--checksums', action='store_true', default=False, help='Compute checksums in the link benchmark.')
+    parser.add_argument('--git_commits', metavar='N', default=200, type=int, help='Number of commits in the history of the remote used by the git benchmark. Default is 200.')
+    parser.add_argument('--git_blob_size', metavar='BYTES', default=256 * 1024, type=int, help='Size of the blob replaced in every commit of the history of the git benchmark. Default is 262144.')
+    parser.add_argument('--library_projects', metavar='N', default=8, type=int, help='Number of projects created concurrently by the library benchmark. Default is 8.')
+    parser.add_argument('--dois', metavar='N', default=200, type=int, help='Number of DOIs resolved by the doi benchmark. Default is 200.')
+    parser.add_argument('--doi_jobs', metavar='N', default=createPro.DOI_JOBS, type=int, help=f'Number of parallel DOI requests. Default is {createPro.DOI_JOBS}.')
+    parser.add_argument('--doi_failures', metavar='N', default=0, type=int, help='Answer every N-th request of the DOI stub with 503. Default is 0, no failures.')
+    parser.add_argument('--doi_latency', metavar='SECONDS', default=0.01, type=float, help='Latency of every request to the DOI stub. Default is 0.01.')
+    parser.add_argument('--resmon_seconds', metavar='SECONDS', default=10, type=float, help='Duration of the recording of the resmon benchmark. Default is 10.')
+    parser.add_argument('--resmon_interval', metavar='SECONDS', default=1.0, type=float, help='Sampling interval of the resmon benchmark. Default is 1.0.')
+    parser.add_argument('--resmon_children', metavar='N', default=8, type=int, help='Number of busy child processes recorded by the resmon benchmark. Default is 8.')
+    parser.add_argument('--baseline', metavar='BASELINE.json', default=BASELINE, type=str, help=f'Timings of a previous run the results are compared with, if it exists. Default is {BASELINE}.')
+    parser.add_argument('--save_baseline', action='store_true', default=False, help='Store the timings of this run as new baseline.')
+    parser.add_argument('--tolerance', metavar='FRACTION', default=BASELINE_TOLERANCE, type=float, help=f'Fail if a timing is more than FRACTION slower than its baseline. Default is {BASELINE_TOLERANCE}.')
+    parser.add_argument('-v', '--version', action='version', version=f'\n%(prog)s {VERSION}')
+
+    return parser.parse_args(args)
+
+def main():
+
+    args = parse_args(sys.argv[1:])
+
+    results = {}
+    for name in args.benchmarks:
+        log(f'Run benchmark {name}')
+        results[name] = BENCHMARKS[name](args)
+
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as r:
+            baseline = json.load(r)
+        if baseline.get('host') != socket.gethostname():
+            log(f'Baseline {args.baseline} was recorded on {baseline.get("host")}, timings are not comparable across hosts')
+        results['baseline'] = {'file': args.baseline, 'compared': True, 'regressions': compareBaseline(results, baseline, args.tolerance)}
+        results['baseline']['passed'] = len(results['baseline']['regressions']) == 0
+    elif not args.save_baseline:
+        # baselines are only comparable on the host they were recorded on, none is shipped
+        log(f'No baseline {args.baseline} exists, the timings are not compared. Record one on this host with --save_baseline.')
+        results['baseline'] = {'file': args.baseline, 'compared': False}
+
+    print(json.dumps(results, indent=4))
+
+    if args.save_baseline:
+        baseline = {'host': socket.gethostname(), 'version': createPro.VERSION, 'timings': dict(timings(results))}
+        with open(args.baseline, 'w') as w:
+            json.dump(baseline, w, indent=4)
+        log(f'Stored {len(baseline["timings"])} timings as baseline in {args.baseline}')
+
+    failed = [name for name in results if isinstance(results[name], dict) and not results[name].get('passed', True)]
+    if len(failed) > 0:
+        sys.stderr.write(f'ERROR: Benchmarks {", ".join(failed)} exceeded their budget or baseline!\n')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
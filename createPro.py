@@ -7,52 +7,96 @@ import re
 import argparse as ap
 import getpass
 import math
-import copy
-import git
-import socket
-import platform
-import psutil
-import GPUtil
-import urllib.request
-from urllib.error import HTTPError
-from urllib.error import URLError
-from pathlib import Path
+import time
+import random
+import hashlib
+import errno
+import threading
+from collections import deque
 from datetime import datetime
+from sciProUtils import log, humanbytes, hashFile, HASH_CHUNK, writeAtomic, Documents, Profiler
 
 ### FUNCTIONS
 
-VERSION = '0.5'
+VERSION = '0.6'
 SCRIPT = __file__
 SCRIPTPATH = os.path.dirname(os.path.abspath(SCRIPT))
-warnings = 0
+
+DOI_PATTERN = re.compile(r'\b(10[.][0-9]{4,}(?:[.][0-9]+)*\/(?:(?!["&\'<>])\S)+)\b')
+DOI_RESOLVER = 'https://doi.org/'
+DOI_JOBS = 8
+DOI_RETRIES = 8
+DOI_BACKOFF = 0.5
+DOI_BACKOFF_MAX = 30
+DOI_TIMEOUT = 30
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'sciProTools')
+DOI_CACHE = os.path.join(CACHE_DIR, 'doi_cache.sqlite')
+DOI_CACHE_TTL = 30 * 24 * 60 * 60
+DOI_CACHE_SIZE = 64 * 1024 ** 2
+REFERENCE_FORMATS = {'.bib': 'bib', '.bibtex': 'bib', '.ris': 'ris', '.csv': 'csv', '.tsv': 'csv'}
+BIB_ENTRY_PATTERN = re.compile(r'\s*@\s*([A-Za-z]+)\s*\{\s*([^,\s{}]*)')
+BIB_DOI_PATTERN = re.compile(r'\bdoi\s*=\s*[{"]?\s*([^}",\s]+)', re.IGNORECASE)
+BIB_TITLE_PATTERN = re.compile(r'\btitle\s*=', re.IGNORECASE)
+BIB_START_PATTERN = re.compile(r'@\s*[A-Za-z]+\s*\{')
+BIB_BRACE_PATTERN = re.compile(r'[{}]')
+RIS_PATTERN = re.compile(r'^([A-Z][A-Z0-9])  -\s?(.*?)\s*$')
+TAB = '|---'
+README_MAX_ENTRIES = 50
+README_MAX_DEPTH = 4
+README_MAX_LINES = 1000
+LINK_BATCH = 256
+AUTO_STRATEGIES = ['hardlink', 'reflink', 'copy']
+LINK_FALLBACK_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOTTY)
+FICLONE = 0x40049409
+MANIFEST_DIR = '.createPro'
+MANIFEST_COLUMNS = ('type', 'path', 'inode', 'size', 'mtime_ns', 'blake2b')
+NO_HASH = '-'
+HASH_BATCH = 64
+SPLIT_NAMES = ('train', 'val', 'test')
+SPLIT_RATIOS = (0.8, 0.2)
+SPLIT_BUFFER = 64 * 1024
+SHARD_SIZE = 256 * 1024 ** 2
+SHARD_INDEX = 'index.bin'
+SHARD_NAMES = 'names'
+GIT_MAX_FILES = 1000
+GIT_MAX_SIZE = 100 * 1024 ** 2
+GIT_MAX_FILE_SIZE = 10 * 1024 ** 2
+TEMPLATE_DIR = os.path.join(SCRIPTPATH, 'templates')
+TEMPLATE = 'default'
+TEMPLATE_PATTERN = re.compile(r'\{\{([#/]?)([A-Za-z_][A-Za-z0-9_]*)\}\}')
+TEMPLATE_VARIABLES = ('project_name', 'project_description', 'author', 'orcid', 'supervisor', 'organization', 'date', 'script', 'version', 'bibtex')
+COMPILED_TEMPLATES = {}
+LOADED_TEMPLATES = {}
+# guards both template caches, projects may be created concurrently in threads of one process
+TEMPLATE_LOCK = threading.RLock()
+SPECS_TIMEOUT = 10
+SPECS_TTL = 60 * 60
+NETWORK_FILESYSTEMS = ('nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'lustre', 'gpfs', 'beegfs', 'cephfs', 'ceph', 'glusterfs', 'fuse.glusterfs', 'fuse.sshfs', 'afs', '9p')
+
+class CreateProError(Exception):
+    '''Error stopping the creation of a project, code is the exit code of the command line script.'''
+
+    def __init__(self, message, code=1):
+        super().__init__(message)
+        self.code = code
 
 def error(string, error_type=1):
-    sys.stderr.write(f'ERROR: {string}\n')
-    sys.exit(error_type)
+    raise CreateProError(string, error_type)
 
-def log(string, newline_before=False):
-    if newline_before:
-        sys.stderr.write('\n')
-    sys.stderr.write(f'LOG: {string}\n')
+def warn(string, warnings=None):
+    '''Log the warning string and append it to the list warnings.'''
+    log(f'\tWARNING: {string}')
+    if warnings is not None:
+        warnings.append(string)
 
-def write(string, *files):
-    for file in files:
-        with open(file, 'a+') as w:
-            w.write(string + '\n')
-        w.close()
-    
-def writeDirDescription(project_name, *files):
+# shared by all projects created in this process, every update holds PROFILE.lock
+PROFILE = Profiler(SCRIPT, VERSION)
+
+def writeDirDescription(docs, project_name, directories, *files):
     for file in files:
-        write(f'\n## {project_name} directory structure:', file)
-        write('-   src: containing project scripts', file)
-        write('-   res: containing project resources and data', file)
-        write('-   bin: containing project binaries', file)
-        write('-   lib: containing external libraries', file)
-        write('-   doc: containing project documentation files', file)
-        write('-   build: containing project binaries', file)
-        write('-   temp: containing temporary files', file)
-        write('-   out: containing output files, produced by processing/analyzing resources', file)
-        write('-   out/plots: containing output plot files and diagrams', file)
+        docs.write(f'\n## {project_name} directory structure:', file)
+        for directory, description in directories.items():
+            docs.write(f'-   {directory}: {description}', file)
 
 def isORCID(orcid):
     # splits orcid into digit set
@@ -78,263 +122,1979 @@ def isORCID(orcid):
     # comparing checksum with check digit
     return str(result) == checkDigit
 
-def linkAllFiles(project_dir, readmemd, walkpath, dst, depth=0):
+def scanTree(walkpath):
+    '''Walk walkpath iteratively with os.scandir and yield every directory depth first.
+
+    Yields (reldir, depth, files, dirs) where reldir is the directory relative to walkpath
+    and files and dirs are the os.DirEntry objects of the directory sorted by name.
+    Symbolic links to directories are not followed.'''
+    stack = [('', 0)]
+    while stack:
+        reldir, depth = stack.pop()
+        files = []
+        dirs = []
+        with os.scandir(os.path.join(walkpath, reldir)) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry)
+                elif entry.is_file():
+                    files.append(entry)
+                else:
+                    log(f'\tWARNING: Skipped {entry.path}, not a file or directory!')
+        files.sort(key=lambda entry: entry.name)
+        dirs.sort(key=lambda entry: entry.name)
+        yield (reldir, depth, files, dirs)
+        # push in reverse to visit subdirectories in sorted order
+        for entry in reversed(dirs):
+            stack.append((os.path.join(reldir, entry.name), depth + 1))
+
+def hardlinkFile(src, dst):
+    os.link(src, dst)
+    return 0
+
+def symlinkFile(src, dst):
+    os.symlink(os.path.abspath(src), dst)
+    return 0
+
+def reflinkFile(src, dst):
+    '''Clone src to dst with the FICLONE ioctl, both files share their data blocks until one is modified.'''
+    import fcntl
+    import shutil
+
+    with open(src, 'rb') as r:
+        with open(dst, 'xb') as w:
+            try:
+                fcntl.ioctl(w.fileno(), FICLONE, r.fileno())
+            except OSError:
+                w.close()
+                os.remove(dst)
+                raise
+    shutil.copystat(src, dst)
+    return 0
+
+def copyFile(src, dst):
+    '''Copy src to dst in the kernel with copy_file_range or sendfile and return the number of copied bytes.
+
+    copy_file_range is not supported across filesystems by every kernel, sendfile is used instead then.'''
+    import shutil
+
+    copied = 0
+    with open(src, 'rb') as r:
+        with open(dst, 'xb') as w:
+            size = os.fstat(r.fileno()).st_size
+            copies = [lambda count: os.sendfile(w.fileno(), r.fileno(), None, count)]
+            if hasattr(os, 'copy_file_range'):
+                copies.insert(0, lambda count: os.copy_file_range(r.fileno(), w.fileno(), count))
+
+            for copy in copies:
+                try:
+                    while copied < size:
+                        sent = copy(min(size - copied, 1024 ** 3))
+                        if sent == 0:
+                            break
+                        copied += sent
+                    break
+                except OSError as e:
+                    if copied > 0 or e.errno not in LINK_FALLBACK_ERRNOS + (errno.ENOSYS,):
+                        raise
+            else:
+                shutil.copyfileobj(r, w)
+                copied = size
+
+    # keep the mtime of src, so --sync and --verify recognize the copy as unchanged
+    shutil.copystat(src, dst)
+    return copied
+
+LINK_FUNCTIONS = {'hardlink': hardlinkFile, 'reflink': reflinkFile, 'symlink': symlinkFile, 'copy': copyFile}
+
+class Linker:
+    '''Link files into the project with a fixed strategy or, with 'auto', the cheapest strategy
+    that works for the devices of source and destination.
+
+    auto tries hardlink, reflink and copy in this order and remembers the first working strategy
+    per pair of devices. Counts the files per strategy and the bytes actually copied.'''
+
+    def __init__(self, strategy='auto'):
+        self.strategy = strategy
+        self.devices = {}
+        self.counts = {name: 0 for name in LINK_FUNCTIONS}
+        self.copied = 0
+        self.lock = threading.Lock()
+
+    def link(self, src, dst, devices=None):
+        if self.strategy != 'auto':
+            candidates = [self.strategy]
+        else:
+            # start with the strategy that worked last time for these devices
+            candidates = AUTO_STRATEGIES[AUTO_STRATEGIES.index(self.devices.get(devices, AUTO_STRATEGIES[0])):]
+
+        for strategy in candidates:
+            try:
+                copied = LINK_FUNCTIONS[strategy](src, dst)
+            except OSError as e:
+                if self.strategy != 'auto' or strategy == candidates[-1] or e.errno not in LINK_FALLBACK_ERRNOS:
+                    error(f'Cannot {strategy} {src} to {dst}: {e.strerror}!', 17)
+                continue
+
+            with self.lock:
+                if self.devices.get(devices) != strategy:
+                    self.devices[devices] = strategy
+                    log(f'Using {strategy} to link files from device {devices[0]} to device {devices[1]}' if devices is not None else f'Using {strategy} to link files')
+                self.counts[strategy] += 1
+                self.copied += copied
+            if copied > 0:
+                PROFILE.count('bytes_copied', copied)
+            return strategy
+
+    def summary(self):
+        used = ', '.join(f'{name}: {count} files' for name, count in self.counts.items() if count > 0)
+        return f'Link strategies {used if used != "" else "none"}, {humanbytes(self.copied)} copied.'
+
+def removeLinkedTree(dst, path, old):
+    '''Remove the linked directory path below dst with all its links and their records in old.
+
+    Only entries recorded in old are removed, a directory still containing other files is an error.'''
+    prefix = path + os.sep
+    stale = [child for child in old if child.startswith(prefix)]
+    # remove files before directories
+    for child in sorted(stale, key=lambda child: child.count(os.sep), reverse=True):
+        record = old.pop(child)
+        try:
+            if record[0] == 'f':
+                os.remove(os.path.join(dst, child))
+            else:
+                os.rmdir(os.path.join(dst, child))
+        except FileNotFoundError:
+            pass
+    try:
+        os.rmdir(os.path.join(dst, path))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        error(f'Cannot replace the linked directory {os.path.join(dst, path)} by a file, it contains files that were not linked: {e}', 14)
+
+def linkFiles(walkpath, dst, jobs=None, old=None, stats=None, linker=None):
+    '''Link all files below walkpath into dst and yield a manifest record for every directory and file.
+
+    Records are (type, path, inode, size, mtime_ns, blake2b) with type 'd' or 'f' and path relative to walkpath.
+    The checksum is NO_HASH, only records of unchanged files keep the checksum of old.
+    If old is a dictionary of path and record of a previous link, files with unchanged inode, size and mtime
+    are not linked again. Records found in old are removed from it, so only deleted paths remain in old.
+
+    Keyword arguments:
+    walkpath -- Directory containing the resources/data
+    dst -- Directory the files are linked to
+    jobs -- Number of threads creating the links
+    old -- Records of a previous link used to link only new and changed files
+    stats -- Dictionary counting 'new', 'changed' and 'unchanged' files
+    linker -- Linker creating the links, default links with strategy auto'''
+    from concurrent.futures import ThreadPoolExecutor
+
+    if jobs is None:
+        jobs = min(32, (os.cpu_count() or 1) + 4)
+    if stats is None:
+        stats = {}
+    for key in ('new', 'changed', 'unchanged'):
+        stats.setdefault(key, 0)
+    if linker is None:
+        linker = Linker()
+
+    def linkBatch(batch):
+        for src, linkdst, devices, replace in batch:
+            if replace and os.path.lexists(linkdst):
+                os.remove(linkdst)
+            linker.link(src, linkdst, devices)
+        PROFILE.count('files_linked', len(batch))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        # links are submitted in batches, pending batches are limited to keep memory flat for huge datasets
+        pending = deque()
+        batch = []
+
+        for reldir, depth, fileentries, direntries in scanTree(walkpath):
+            linkdir = os.path.join(dst, reldir)
+            dirpath = reldir if reldir != '' else '.'
+            previous = old.pop(dirpath, None) if old is not None else None
+            if previous is not None and previous[0] == 'f' and os.path.lexists(linkdir):
+                # a linked file was replaced by a directory in walkpath
+                os.remove(linkdir)
+            os.makedirs(linkdir, exist_ok=True)
+            linkdev = os.stat(linkdir).st_dev
+            yield ('d', dirpath, 0, 0, 0, NO_HASH)
+
+            linked = 0
+            statted = 0
+            for entry in fileentries:
+                path = os.path.join(reldir, entry.name)
+                stat = entry.stat()
+                statted += stat.st_size
+                record = ('f', path, stat.st_ino, stat.st_size, stat.st_mtime_ns, NO_HASH)
+
+                previous = old.pop(path, None) if old is not None else None
+                if previous is not None and previous[0] == 'd':
+                    # a linked directory was replaced by a file in walkpath
+                    removeLinkedTree(dst, path, old)
+                if previous is None:
+                    batch.append((entry.path, os.path.join(linkdir, entry.name), (stat.st_dev, linkdev), False))
+                    stats['new'] += 1
+                    linked += 1
+                elif previous[2:5] != record[2:5]:
+                    batch.append((entry.path, os.path.join(linkdir, entry.name), (stat.st_dev, linkdev), True))
+                    stats['changed'] += 1
+                    linked += 1
+                else:
+                    # keep the checksum of the unchanged file
+                    record = previous
+                    stats['unchanged'] += 1
+
+                if len(batch) >= LINK_BATCH:
+                    pending.append(pool.submit(linkBatch, batch))
+                    batch = []
+                    if len(pending) > jobs * 4:
+                        pending.popleft().result()
+                yield record
+
+            PROFILE.count('files_statted', len(fileentries))
+            PROFILE.count('bytes_statted', statted)
+            if linked > 0:
+                log(f'Linked {linked} files from {os.path.join(walkpath, reldir)} to {linkdir}')
+
+        pending.append(pool.submit(linkBatch, batch))
+        while pending:
+            pending.popleft().result()
+
+def processPool(jobs=None):
+    '''Return a ProcessPoolExecutor with jobs processes started by a fork server or spawned.
+
+    Linker, phase and probe threads run while the pools are used, forking a process with live threads
+    may deadlock the child on a lock held by another thread.'''
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context(method))
+
+def hashFiles(paths):
+    buffer = bytearray(HASH_CHUNK)
+    return [hashFile(path, buffer) for path in paths]
+
+def hashRecords(records, walkpath, jobs=None):
+    '''Compute the missing checksums of file records in a process pool and yield the records in their original order.
+
+    Keyword arguments:
+    records -- Manifest records with paths relative to walkpath
+    walkpath -- Directory containing the hashed files
+    jobs -- Number of hashing processes, default is the number of CPUs'''
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    def submit(pool, batch):
+        paths = [os.path.join(walkpath, record[1]) for record in batch if record[0] == 'f' and record[5] == NO_HASH]
+        PROFILE.count('files_hashed', len(paths))
+        PROFILE.count('bytes_hashed', sum(record[3] for record in batch if record[0] == 'f' and record[5] == NO_HASH))
+        return (batch, pool.submit(hashFiles, paths) if len(paths) > 0 else None)
+
+    def finish(batch, future):
+        digests = iter(future.result()) if future is not None else iter(())
+        for record in batch:
+            if record[0] == 'f' and record[5] == NO_HASH:
+                record = record[:5] + (next(digests),)
+            yield record
+
+    with processPool(jobs) as pool:
+        # pending batches are limited to keep memory flat for huge datasets
+        pending = deque()
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= HASH_BATCH:
+                pending.append(submit(pool, batch))
+                batch = []
+                if len(pending) > jobs * 4:
+                    yield from finish(*pending.popleft())
+        pending.append(submit(pool, batch))
+        while pending:
+            yield from finish(*pending.popleft())
+
+class DataTree:
+    '''Render manifest records as README data tree with a bounded number of lines.
+
+    Only the first max_entries entries of a directory, directories up to max_depth and max_lines lines
+    in total are listed, 0 disables a limit. The remaining entries are collapsed into one aggregate line
+    per listed directory with their number of files and folders, their size and the top file extensions.'''
+
+    def __init__(self, docs, readmemd, readmedst, max_entries=README_MAX_ENTRIES, max_depth=README_MAX_DEPTH, max_lines=README_MAX_LINES):
+        self.docs = docs
+        self.readmemd = readmemd
+        self.readmedst = readmedst
+        self.max_entries = max_entries if max_entries > 0 else math.inf
+        self.max_depth = max_depth if max_depth > 0 else math.inf
+        self.max_lines = max_lines if max_lines > 0 else math.inf
+        self.lines = 0
+        self.collapsed = 0
+        # open directories from the root to the current directory
+        self.stack = []
+
+    def line(self, depth, string, size=None):
+        if size is not None:
+            string += '.' * (60-len(f'{TAB*depth}|--> {string}')) + humanbytes(size)
+        self.docs.write(f'``{TAB*depth}|--> {string}``<br>', self.readmemd)
+
+    def directory(self, path, depth, visible, owner):
+        node = {'path': path, 'depth': depth, 'visible': visible, 'shown': 0, 'files': 0, 'folders': 0, 'size': 0, 'extensions': {}}
+        node['owner'] = node if visible else owner
+        return node
+
+    def close(self, node):
+        '''Write the aggregate line of all collapsed entries below a listed directory.'''
+        if node['visible'] and node['files'] + node['folders'] > 0:
+            top = sorted(node['extensions'].items(), key=lambda item: (-item[1], item[0]))[:3]
+            extensions = ', '.join(f'{extension}: {count}' for extension, count in top)
+            self.line(node['depth'], f'... {node["files"]} more files in {node["folders"]} folders' + (f' ({extensions})' if extensions != '' else ''), node['size'])
+
+    def add(self, record):
+        recordtype, path, inode, size, mtime, digest = record
+        if path == '.':
+            self.stack.append(self.directory('', 0, True, None))
+            return
+
+        # leave all directories that do not contain path
+        parentpath = os.path.dirname(path)
+        while self.stack[-1]['path'] != parentpath:
+            self.close(self.stack.pop())
+        parent = self.stack[-1]
+        visible = parent['visible'] and parent['shown'] < self.max_entries and self.lines < self.max_lines
+
+        if recordtype == 'd':
+            depth = path.count(os.sep) + 1
+            visible = visible and depth <= self.max_depth
+            if visible:
+                self.line(depth - 1, f'{self.readmedst}/{path}')
+            else:
+                parent['owner']['folders'] += 1
+            self.stack.append(self.directory(path, depth, visible, parent['owner']))
+        else:
+            if visible:
+                self.line(path.count(os.sep), f'{self.readmedst}/{path}', size)
+            else:
+                owner = parent['owner']
+                owner['files'] += 1
+                owner['size'] += size
+                extension = os.path.splitext(path)[1].lower() or 'no extension'
+                owner['extensions'][extension] = owner['extensions'].get(extension, 0) + 1
+                self.collapsed += 1
+
+        if visible:
+            parent['shown'] += 1
+            self.lines += 1
+
+    def finish(self):
+        while self.stack:
+            self.close(self.stack.pop())
+
+def writeDataSection(docs, project_dir, readmemd, dst, records, label='', manifest=None, source='', checksums=False, hash_jobs=None, linker=None, readme_limits=None):
+    '''Write the data tree of records into readmemd, stream records into manifest and the full listing into a compressed index.
+
+    The tree is enclosed in markers, so --sync can replace it later on. Its size is bounded by readme_limits,
+    a dictionary of DataTree arguments, the complete tree is written to doc/data_index_<dst>.txt.gz.
+    If checksums is set, missing checksums are computed from the files in source.
+    Returns (files, folders, foldersize) of records.'''
+    import gzip
+
     files = 0
-    folders = 1
+    folders = 0
     foldersize = 0
+    readmedst = os.path.join(os.sep, os.path.relpath(dst, project_dir))
+    marker = os.path.relpath(dst, project_dir)
+    tree = DataTree(docs, readmemd, readmedst, **(readme_limits or {}))
+
+    index = indexPath(project_dir, dst)
+    indextmp = f'{index}.{os.getpid()}.{threading.get_ident()}.tmp'
+    os.makedirs(os.path.dirname(index), exist_ok=True)
+    indexfile = gzip.open(indextmp, 'wt')
+
+    if manifest is not None:
+        os.makedirs(os.path.dirname(manifest), exist_ok=True)
+        tmp = f'{manifest}.{os.getpid()}.{threading.get_ident()}.tmp'
+        manifestfile = open(tmp, 'x')
+        manifestfile.write(f'# source\t{os.path.abspath(source)}\n# destination\t{marker}\n# label\t{label}\n# checksums\t{"blake2b" if checksums else "none"}\n')
+        if linker is not None:
+            manifestfile.write(f'# strategy\t{linker.strategy}\n')
+        manifestfile.write('\t'.join(MANIFEST_COLUMNS) + '\n')
+
+    if checksums:
+        records = hashRecords(records, source, jobs=hash_jobs)
+
+    docs.write(f'<!-- createPro data {marker} -->', readmemd)
+    for record in records:
+        if manifest is not None:
+            manifestfile.write('\t'.join(map(str, record)) + '\n')
+
+        tree.add(record)
+        recordtype, path, inode, size, mtime, digest = record
+        if recordtype == 'd':
+            folders += 1
+            if path != '.':
+                indexfile.write(f'{TAB*path.count(os.sep)}|--> {readmedst}/{path}\n')
+        else:
+            indexfile.write(f'{TAB*path.count(os.sep)}|--> {readmedst}/{path}\t{size}\n')
+            files += 1
+            foldersize += size
+    tree.finish()
+
+    indexfile.close()
+    os.replace(indextmp, index)
+
+    if tree.collapsed > 0:
+        docs.write(f'{tree.collapsed} files are not listed, see {os.path.relpath(index, project_dir)} for all files.<br>', readmemd)
+    docs.write(f'Linked {label}{files} files in {folders} folders with a total datasize of {humanbytes(foldersize)}.<br>', readmemd)
+    if linker is not None:
+        docs.write(f'{linker.summary()}<br>', readmemd)
+        log(linker.summary())
+    docs.write(f'<!-- createPro data end {marker} -->', readmemd)
+
+    if manifest is not None:
+        manifestfile.close()
+        os.replace(tmp, manifest)
 
-    # check and edit input path strings
-    tab = '|---'
+    return (files, folders, foldersize)
 
-    # make sure directory exists
-    if not os.path.exists(dst):
-        os.makedirs(dst)
+def linkAllFiles(docs, project_dir, readmemd, walkpath, dst, jobs=None, label='', checksums=False, hash_jobs=None, strategy='auto', readme_limits=None):
+    '''Link all files below walkpath into dst with strategy, write the data tree into readmemd and the manifest of the link.
+
+    Returns (files, folders, foldersize) of the linked tree.'''
+    linker = Linker(strategy)
+    return writeDataSection(docs=docs,
+                            project_dir=project_dir,
+                            readmemd=readmemd,
+                            dst=dst,
+                            records=linkFiles(walkpath, dst, jobs=jobs, linker=linker),
+                            linker=linker,
+                            label=label,
+                            manifest=manifestPath(project_dir, dst),
+                            source=walkpath,
+                            checksums=checksums,
+                            hash_jobs=hash_jobs,
+                            readme_limits=readme_limits)
+
+class SplitWriter:
+    '''Write the paths of a split as list, one path per line, and the byte offsets of all lines as index.
+
+    The index holds n + 1 little-endian unsigned 64 bit offsets, line i spans offsets[i] to offsets[i + 1] - 1,
+    e.g. readable with numpy.fromfile(index, dtype='<u8') or array('Q'). Both files are replaced at close.'''
+
+    def __init__(self, file, index):
+        from array import array
+
+        self.files = [file, index]
+        self.tmps = [f'{path}.{os.getpid()}.{threading.get_ident()}.tmp' for path in self.files]
+        self.writers = [open(tmp, 'xb') for tmp in self.tmps]
+        self.offsets = array('Q')
+        self.offset = 0
+        self.count = 0
+
+    def add(self, path):
+        line = os.fsencode(path) + b'\n'
+        self.offsets.append(self.offset)
+        self.writers[0].write(line)
+        self.offset += len(line)
+        self.count += 1
+        if len(self.offsets) >= SPLIT_BUFFER:
+            self.flushOffsets()
+
+    def flushOffsets(self):
+        if sys.byteorder == 'big':
+            self.offsets.byteswap()
+        self.offsets.tofile(self.writers[1])
+        del self.offsets[:]
+
+    def close(self):
+        self.offsets.append(self.offset)
+        self.flushOffsets()
+        for writer in self.writers:
+            writer.close()
+        for tmp, path in zip(self.tmps, self.files):
+            os.replace(tmp, path)
+
+    def abort(self):
+        for writer, tmp in zip(self.writers, self.tmps):
+            writer.close()
+            os.remove(tmp)
+
+def splitData(walkpath, dst, ratios=SPLIT_RATIOS, seed='', stratify=False):
+    '''Split all files below walkpath by the hash of their paths into splits listed in dst, no file is linked.
+
+    Every file gets a position in [0, 1) from the BLAKE2b hash of seed and its path relative to walkpath,
+    the ratios divide this interval into the splits train, val and test. The split is deterministic and equal
+    on every machine, and a file keeps its split if other files are added or removed.
+    With stratify every top level subdirectory, e.g. a class, is split exactly by ratios:
+    its files are sorted by position and cut at the ratios, only one subdirectory is kept in memory.
+    Every split is written as dst/<split>.txt with the relative paths and dst/<split>.idx with their offsets.
+
+    Keyword arguments:
+    walkpath -- Directory of the dataset
+    dst -- Directory of the split lists
+    ratios -- Two or three positive ratios of train, val and test, normalized to a sum of 1
+    seed -- String changing the split
+    stratify -- Split every top level subdirectory by ratios
+    Returns a list of (split, files) per split.'''
+    from bisect import bisect_right
+    from itertools import accumulate
+
+    names = SPLIT_NAMES[:len(ratios)]
+    bounds = list(accumulate(ratio / sum(ratios) for ratio in ratios))
+    bounds[-1] = 1.0
+    seeded = hashlib.blake2b(seed.encode('utf-8') + b'\0', digest_size=8)
+
+    def position(path):
+        digest = seeded.copy()
+        digest.update(os.fsencode(path))
+        # 53 bits fit exactly into a float below 1
+        return (int.from_bytes(digest.digest(), 'big') >> 11) / 2 ** 53
+
+    writers = []
+    try:
+        for name in names:
+            writers.append(SplitWriter(os.path.join(dst, f'{name}.txt'), os.path.join(dst, f'{name}.idx')))
+
+        def splitStratum(paths):
+            splits = [0] * len(paths)
+            order = sorted(range(len(paths)), key=lambda i: paths[i][0])
+            start = 0
+            for split, bound in enumerate(bounds):
+                end = round(bound * len(paths))
+                for i in order[start:end]:
+                    splits[i] = split
+                start = end
+            # the lists keep the sorted order of the scan
+            for (key, path), split in zip(paths, splits):
+                writers[split].add(path)
+
+        stratum = None
+        paths = []
+        for reldir, depth, files, dirs in scanTree(walkpath):
+            PROFILE.count('files_split', len(files))
+            for entry in files:
+                path = os.path.join(reldir, entry.name).replace(os.sep, '/')
+                if '\n' in path:
+                    log(f'\tWARNING: Skipped {entry.path}, the split lists cannot contain newlines!')
+                    continue
+                if not stratify:
+                    writers[bisect_right(bounds, position(path))].add(path)
+                    continue
+                # top level subdirectories are scanned one after another
+                top = path.split('/', 1)[0] if depth > 0 else ''
+                if top != stratum:
+                    splitStratum(paths)
+                    stratum = top
+                    paths = []
+                paths.append((position(path), path))
+        splitStratum(paths)
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+
+    for writer in writers:
+        writer.close()
+    return [(name, writer.count) for name, writer in zip(names, writers)]
+
+def shardName(number):
+    return f'shard-{number:05d}.tar'
+
+def packShard(walkpath, shard, paths):
+    '''Pack the files paths relative to walkpath into the tar file shard and return (offset, size) of the data of every file.'''
+    import tarfile
+
+    tmp = f'{shard}.{os.getpid()}.tmp'
+    entries = []
+    try:
+        with tarfile.open(tmp, 'x', format=tarfile.PAX_FORMAT, dereference=True) as tar:
+            for path in paths:
+                source = os.path.join(walkpath, path)
+                info = tar.gettarinfo(source, arcname=path)
+                # fractional mtimes would need an extended header per file
+                info.mtime = int(info.mtime)
+                with open(source, 'rb') as r:
+                    tar.addfile(info, r)
+                # the data ends at the current offset of the archive, padded to whole blocks
+                entries.append((tar.offset - -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE, info.size))
+        os.replace(tmp, shard)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return entries
+
+def packShards(walkpath, dst, shard_size=SHARD_SIZE, jobs=None):
+    '''Pack all files below walkpath into tar shards of about shard_size bytes in dst, built by jobs processes.
+
+    Files are assigned to shards in the sorted order of the scan, a file larger than shard_size gets a shard of its own.
+    Besides the shards dst contains names.txt with the paths of all samples, names.idx with the byte offsets of its lines
+    and index.bin with shard, offset and size of every sample as little-endian uint64, see ShardReader.
+
+    Keyword arguments:
+    walkpath -- Directory of the resources/data
+    dst -- Directory of the shards
+    shard_size -- Maximum size of a shard in bytes
+    jobs -- Number of packing processes, default is the number of CPUs
+    Returns (files, folders, size, shards), shards is a list of (shard, files, shard size).'''
+    import tarfile
+    from array import array
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    files = 0
+    folders = 0
+    size = 0
+    shards = []
+    index = f'{os.path.join(dst, SHARD_INDEX)}.{os.getpid()}.{threading.get_ident()}.tmp'
+    names = SplitWriter(os.path.join(dst, f'{SHARD_NAMES}.txt'), os.path.join(dst, f'{SHARD_NAMES}.idx'))
+
+    def finish(number, paths, future, w):
+        entries = array('Q')
+        for offset, length in future.result():
+            entries.extend((number, offset, length))
+        if sys.byteorder == 'big':
+            entries.byteswap()
+        entries.tofile(w)
+        shards.append((shardName(number), len(paths), os.path.getsize(os.path.join(dst, shardName(number)))))
 
-    # walk files and link them
-    entry = next(os.walk(walkpath))
-    for linkfile in entry[2]:
-        linkdst = os.path.join(dst, linkfile)
-        os.link(src=os.path.join(walkpath, linkfile), dst=linkdst)
+    try:
+        with processPool(jobs) as pool, open(index, 'xb') as w:
+            # pending shards are limited to keep memory flat for huge datasets
+            pending = deque()
+
+            def submit(paths):
+                number = len(shards) + len(pending)
+                pending.append((number, paths, pool.submit(packShard, walkpath, os.path.join(dst, shardName(number)), paths)))
+                if len(pending) > jobs * 2:
+                    finish(*pending.popleft(), w)
+
+            # the end of the archive is padded to a whole record
+            paths = []
+            shardsize = tarfile.RECORDSIZE
+            for reldir, depth, entries, dirs in scanTree(walkpath):
+                folders += 1
+                for entry in entries:
+                    path = os.path.join(reldir, entry.name)
+                    if '\n' in path:
+                        log(f'\tWARNING: Skipped {entry.path}, the list of samples cannot contain newlines!')
+                        continue
+                    length = entry.stat().st_size
+                    # tar header, extended header of long or non-ASCII paths and data padded to whole blocks
+                    encoded = os.fsencode(path)
+                    member = tarfile.BLOCKSIZE * (1 + -(-length // tarfile.BLOCKSIZE))
+                    if len(encoded) > 100 or not path.isascii():
+                        member += tarfile.BLOCKSIZE * (1 + -(-(len(encoded) + 32) // tarfile.BLOCKSIZE))
+                    if len(paths) > 0 and shardsize + member > shard_size:
+                        submit(paths)
+                        paths = []
+                        shardsize = tarfile.RECORDSIZE
+                    paths.append(path)
+                    names.add(path)
+                    shardsize += member
+                    files += 1
+                    size += length
+            if len(paths) > 0:
+                submit(paths)
+            while pending:
+                finish(*pending.popleft(), w)
+        os.replace(index, os.path.join(dst, SHARD_INDEX))
+    except BaseException:
+        names.abort()
+        if os.path.exists(index):
+            os.remove(index)
+        raise
+    names.close()
+
+    PROFILE.count('files_packed', files)
+    PROFILE.count('bytes_packed', size)
+    return (files, folders, size, shards)
+
+class ShardReader:
+    '''Read the samples packed by --shards from memory mapped shards without extracting them.
+
+    Samples are addressed by their position in names.txt or by their path, iterating yields (path, data) of all samples.
+    Shards are mapped on first access, the lookup by path is built on first use.
+
+        with ShardReader('project/res/traindata') as reader:
+            data = reader[0]
+            data = reader['class_a/image_1.png']
+
+    Keyword arguments:
+    directory -- Directory of the shards, e.g. project/res/traindata'''
+
+    def __init__(self, directory):
+        import struct
+
+        self.directory = directory
+        self.shards = {}
+        self.paths = None
+        self.entry = struct.Struct('<QQQ')
+        self.offsets = struct.Struct('<QQ')
+        self.index = self.map(SHARD_INDEX)
+        self.names = self.map(f'{SHARD_NAMES}.txt')
+        self.lines = self.map(f'{SHARD_NAMES}.idx')
+        self.length = len(self.index) // self.entry.size
+
+    def map(self, name):
+        import mmap
+
+        with open(os.path.join(self.directory, name), 'rb') as r:
+            if os.fstat(r.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.length
+
+    def position(self, sample):
+        if isinstance(sample, str):
+            if self.paths is None:
+                self.paths = dict((self.name(i), i) for i in range(self.length))
+            return self.paths[sample]
+        if sample < 0:
+            sample += self.length
+        if not 0 <= sample < self.length:
+            raise IndexError(f'Sample {sample} is out of range of {self.length} samples')
+        return sample
+
+    def name(self, sample):
+        '''Return the path of sample relative to the packed resources/data.'''
+        start, end = self.offsets.unpack_from(self.lines, self.position(sample) * 8)
+        return os.fsdecode(self.names[start:end - 1])
+
+    def __getitem__(self, sample):
+        '''Return the data of sample, given by position or path, as bytes.'''
+        shard, offset, size = self.entry.unpack_from(self.index, self.position(sample) * self.entry.size)
+        if shard not in self.shards:
+            self.shards[shard] = self.map(shardName(shard))
+        return self.shards[shard][offset:offset + size]
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield (self.name(i), self[i])
+
+    def close(self):
+        for mapped in [self.index, self.names, self.lines] + list(self.shards.values()):
+            if not isinstance(mapped, bytes):
+                mapped.close()
+        self.shards = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def manifestPath(project_dir, dst):
+    '''Return the path of the manifest of the resources/data linked to dst.'''
+    name = os.path.relpath(dst, project_dir).replace(os.sep, '_')
+    return os.path.join(project_dir, MANIFEST_DIR, f'manifest_{name}.tsv')
+
+def indexPath(project_dir, dst):
+    '''Return the path of the compressed listing of all resources/data linked to dst.'''
+    name = os.path.relpath(dst, project_dir).replace(os.sep, '_')
+    return os.path.join(project_dir, 'doc', f'data_index_{name}.txt.gz')
+
+def readManifest(manifest):
+    '''Return (header, records) of manifest, records is a dictionary of path and record.'''
+    header = {}
+    records = {}
+    with open(manifest, 'r') as r:
+        for line in r:
+            line = line.rstrip('\n')
+            if line.startswith('# '):
+                key, value = line[2:].split('\t', 1)
+                header[key] = value
+            elif line.startswith('type\t'):
+                continue
+            else:
+                fields = line.split('\t')
+                digest = fields[5] if len(fields) > 5 else NO_HASH
+                records[fields[1]] = (fields[0], fields[1], int(fields[2]), int(fields[3]), int(fields[4]), digest)
+    return (header, records)
+
+def gitignorePattern(path):
+    '''Return a .gitignore pattern matching exactly the path relative to the project.'''
+    pattern = re.sub(r'([*?\[\\])', r'\\\1', path.replace(os.sep, '/'))
+    if pattern.endswith(' '):
+        pattern = pattern[:-1] + '\\ '
+    return f'/{pattern}'
+
+def gitignoreData(project_dir, dst, files, size, keep=(), max_files=GIT_MAX_FILES, max_size=GIT_MAX_SIZE, max_file_size=GIT_MAX_FILE_SIZE):
+    '''Return the .gitignore patterns keeping the resources/data linked to dst out of git.
+
+    If the linked tree has more than max_files files or more than max_size bytes, all of dst is ignored
+    except the paths in keep. Otherwise only the files larger than max_file_size are ignored, found in the manifest
+    of the link. 0 disables a limit.
+
+    Keyword arguments:
+    project_dir -- Path of the project
+    dst -- Directory the resources/data are linked to
+    files -- Number of linked files
+    size -- Total size of the linked files in bytes
+    keep -- Paths relative to project_dir that stay tracked, e.g. README files
+    max_files -- Maximum number of tracked files
+    max_size -- Maximum total size of tracked files in bytes
+    max_file_size -- Maximum size of a tracked file in bytes'''
+    rel = os.path.relpath(dst, project_dir)
+    if (max_files > 0 and files > max_files) or (max_size > 0 and size > max_size):
+        log(f'Ignoring {rel} in git, it contains {files} files with {humanbytes(size)}')
+        patterns = [f'{gitignorePattern(rel)}/*']
+        for path in keep:
+            if os.path.dirname(path) == rel:
+                patterns.append(f'!{gitignorePattern(path)}')
+        return patterns
+
+    patterns = []
+    if max_file_size > 0:
+        header, records = readManifest(manifestPath(project_dir, dst))
+        for record in records.values():
+            if record[0] == 'f' and record[3] > max_file_size:
+                patterns.append(gitignorePattern(os.path.join(rel, record[1])))
+        if len(patterns) > 0:
+            log(f'Ignoring {len(patterns)} files of {rel} larger than {humanbytes(max_file_size)} in git')
+    return patterns
+
+def trackedSize(repo):
+    '''Return (files, size) git tracks in the working tree of repo, the files in the index and untracked files that are not ignored.
+
+    Files added to the index although they are ignored are counted, call it after staging.'''
+    files = 0
+    size = 0
+    for path in dict.fromkeys(repo.git.ls_files('--cached', '--others', '--exclude-standard', '-z').split('\0')):
+        if path == '':
+            continue
+        try:
+            size += os.lstat(os.path.join(repo.working_tree_dir, path)).st_size
+            files += 1
+        except FileNotFoundError:
+            pass
+    return (files, size)
+
+def syncProject(project_dir, jobs=None, hash_jobs=None, readme_limits=None):
+    '''Link new and changed resources/data into an existing project, remove links of deleted files
+    and replace the data sections of README.md.'''
+    readmemd = os.path.join(project_dir, 'README.md')
+    manifestdir = os.path.join(project_dir, MANIFEST_DIR)
+    if not os.path.isdir(manifestdir):
+        error(f'Cannot sync {project_dir}, it contains no linked resources/data!', 13)
 
-        # write readme and log
-        points = '.' * (60-len(f'{tab*depth}|--> {linkdst.split(project_dir)[-1]}'))
-        filesize = os.path.getsize(linkdst)
-        write(f'``{tab*depth}|--> {linkdst.split(project_dir)[-1]}{points}{humanbytes(filesize)}``<br>', readmemd)
-        log(f'Linked {walkpath + linkfile} to {os.path.join(project_dir, dst.split(project_dir)[1], linkfile)}')
-        files += 1
-        foldersize += filesize
+    with open(readmemd, 'r') as r:
+        readme = r.read()
 
-    # walk directories
-    for linkdir in entry[1]:
-        write(f'``{tab*depth}|--> {dst.split(project_dir)[-1]}{linkdir}``<br>', readmemd)
-        return tuple(map(sum, zip((files, folders, foldersize), linkAllFiles(project_dir=project_dir, readmemd=readmemd, walkpath=os.path.join(walkpath, linkdir), dst=os.path.join(dst, linkdir), depth=depth + 1))))
+    for manifest in sorted(os.listdir(manifestdir)):
+        if not manifest.startswith('manifest_') or not manifest.endswith('.tsv'):
+            continue
+        manifest = os.path.join(manifestdir, manifest)
+        header, old = readManifest(manifest)
+        source = header['source']
+        dst = os.path.join(project_dir, header['destination'])
+        if not os.path.isdir(source):
+            error(f'Cannot sync {dst}, source {source} does not exist anymore!', 14)
+        log(f'Sync {source} to {dst}')
+
+        docs = Documents()
+        stats = {}
+        linker = Linker(header.get('strategy', 'hardlink'))
+        (files, folders, datasize) = writeDataSection(docs=docs,
+                                                      project_dir=project_dir,
+                                                      readmemd=readmemd,
+                                                      dst=dst,
+                                                      records=linkFiles(source, dst, jobs=jobs, old=old, stats=stats, linker=linker),
+                                                      linker=linker,
+                                                      label=header.get('label', ''),
+                                                      manifest=manifest,
+                                                      source=source,
+                                                      checksums=header.get('checksums', 'none') == 'blake2b',
+                                                      hash_jobs=hash_jobs,
+                                                      readme_limits=readme_limits)
+
+        # remaining records of the old manifest were deleted in source, remove files before directories
+        deleted = 0
+        for path in sorted(old, key=lambda path: path.count(os.sep), reverse=True):
+            try:
+                if old[path][0] == 'f':
+                    os.remove(os.path.join(dst, path))
+                    deleted += 1
+                else:
+                    os.rmdir(os.path.join(dst, path))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log(f'\tWARNING: Could not remove {os.path.join(dst, path)}: {e}')
+        log(f'Synced {files} files in {folders} folders of size {humanbytes(datasize)}: {stats["new"]} new, {stats["changed"]} changed, {deleted} deleted, {stats["unchanged"]} unchanged.')
+
+        # replace only the data section of this link in README.md
+        marker = header['destination']
+        begin = readme.find(f'<!-- createPro data {marker} -->')
+        end = readme.find(f'<!-- createPro data end {marker} -->')
+        if begin == -1 or end == -1:
+            log(f'\tWARNING: No data section of {marker} found in {readmemd}, README.md is not updated!')
+            continue
+        end += len(f'<!-- createPro data end {marker} -->\n')
+        readme = readme[:begin] + ''.join(docs.buffers[readmemd]) + readme[end:]
 
-    return (files, folders, foldersize)
+    writeAtomic(readmemd, readme, append=False)
+    log(f'Updated {readmemd}')
+
+def verifyProject(project_dir, hash_jobs=None, rehash=False):
+    '''Check the linked resources/data of project_dir against their manifests.
+
+    Files with the size and mtime of the manifest are considered unchanged, only other files are hashed again.
+    With rehash all files are hashed. Returns the number of missing or modified files.'''
+
+    manifestdir = os.path.join(project_dir, MANIFEST_DIR)
+    if not os.path.isdir(manifestdir):
+        error(f'Cannot verify {project_dir}, it contains no linked resources/data!', 13)
+
+    failed = 0
+    for manifest in sorted(os.listdir(manifestdir)):
+        if not manifest.startswith('manifest_') or not manifest.endswith('.tsv'):
+            continue
+        header, records = readManifest(os.path.join(manifestdir, manifest))
+        dst = os.path.join(project_dir, header['destination'])
+        log(f'Verify {dst}')
+
+        counts = {'ok': 0, 'missing': 0, 'modified': 0, 'touched': 0}
+        check = []
+        for record in records.values():
+            if record[0] != 'f':
+                continue
+            try:
+                stat = os.stat(os.path.join(dst, record[1]))
+            except FileNotFoundError:
+                log(f'\tMISSING: {os.path.join(dst, record[1])}')
+                counts['missing'] += 1
+                continue
+
+            if stat.st_size != record[3]:
+                log(f'\tMODIFIED: {os.path.join(dst, record[1])} changed its size')
+                counts['modified'] += 1
+            elif rehash or stat.st_mtime_ns != record[4]:
+                if record[5] == NO_HASH:
+                    log(f'\tMODIFIED: {os.path.join(dst, record[1])} changed its mtime and has no checksum')
+                    counts['modified'] += 1
+                else:
+                    check.append(record)
+            else:
+                counts['ok'] += 1
+
+        # hash only files that could have changed
+        if len(check) > 0:
+            log(f'Hash {len(check)} files of {dst}')
+            batches = [check[i:i + HASH_BATCH] for i in range(0, len(check), HASH_BATCH)]
+            with processPool(hash_jobs) as pool:
+                for batch, digests in zip(batches, pool.map(hashFiles, [[os.path.join(dst, record[1]) for record in batch] for batch in batches])):
+                    for record, digest in zip(batch, digests):
+                        if digest == record[5]:
+                            counts['ok' if rehash else 'touched'] += 1
+                        else:
+                            log(f'\tMODIFIED: {os.path.join(dst, record[1])} does not match its checksum')
+                            counts['modified'] += 1
+
+        log(f'Verified {dst}: {counts["ok"]} ok, {counts["touched"]} with new mtime but same content, {counts["modified"]} modified, {counts["missing"]} missing.')
+        failed += counts['modified'] + counts['missing']
+
+    return failed
 
 # https://stackoverflow.com/questions/12523586/python-format-size-application-converting-b-to-kb-mb-gb-tb
-def humanbytes(B):
-    '''Return the given bytes as a human friendly KB, MB, GB, or TB string'''
-    B = float(B)
-    KB = float(1024)
-    MB = float(KB ** 2) # 1,048,576
-    GB = float(KB ** 3) # 1,073,741,824
-    TB = float(KB ** 4) # 1,099,511,627,776
-
-    if B < KB:
-        return '{0} {1}'.format(B,'Bytes' if 0 == B > 1 else 'Byte')
-    elif KB <= B < MB:
-        return '{0:.4f} KB'.format(B/KB)
-    elif MB <= B < GB:
-        return '{0:.4f} MB'.format(B/MB)
-    elif GB <= B < TB:
-        return '{0:.4f} GB'.format(B/GB)
-    elif TB <= B:
-        return '{0:.4f} TB'.format(B/TB)
-
-def getSpecs():
-    cpufreqstring = ''
-    try:
-        cpufreq = psutil.cpu_freq()
-        cpufreqstring = f'-    Max Frequency: {cpufreq.max:.2f}Mhz\n-    Min Frequency: {cpufreq.min:.2f}Mhz\n' 
-    except NotImplementedError:
-        cpufreqstring = '-    Max Frequency: N/A\n-    Min Frequency: N/A\n'
-    svmem = psutil.virtual_memory()
-    swap = psutil.swap_memory()
-    
-    gpus = GPUtil.getGPUs()
-    gpustring = ''
-    for gpu in gpus:
-        gpustring += f'-    ID: {gpu.id}\n    -    GPU: {gpu.name}\n    -    Total memory: {gpu.memoryTotal}MB\n'
-    
-    partitions = psutil.disk_partitions()
-    diskstring = ''
-    for partition in partitions:
+def runProbes(probes, timeout, warnings=None):
+    '''Run every probe concurrently in a daemon thread and return (results, failed).
+
+    results holds the results of the probes finished in time, failed the names of the probes that raised an error
+    or timed out. Probes denied by missing permissions are left out of both.
+    Probes that time out keep running in the background but do not block the exit of the interpreter.
+
+    Keyword arguments:
+    probes -- Dictionary of probe names and functions without arguments
+    timeout -- Seconds every probe may take
+    warnings -- List the warnings are appended to'''
+    results = {}
+    threads = {}
+    failed = []
+
+    def run(name, probe):
         try:
-            partition_usage = psutil.disk_usage(partition.mountpoint)
+            results[name] = probe()
         except PermissionError:
+            pass
+        except Exception as e:
+            failed.append(name)
+            warn(f'Hardware probe {name} failed: {e}', warnings)
+
+    for name, probe in probes.items():
+        threads[name] = threading.Thread(target=run, args=(name, probe), daemon=True)
+        threads[name].start()
+
+    deadline = time.monotonic() + timeout
+    for name, thread in threads.items():
+        thread.join(max(0, deadline - time.monotonic()))
+        if thread.is_alive():
+            failed.append(name)
+            warn(f'Hardware probe {name} did not finish within {timeout} seconds!', warnings)
+
+    return ({name: results[name] for name in probes if name in results}, failed)
+
+def collectSpecs(timeout=SPECS_TIMEOUT, skip_netfs=False, warnings=None):
+    '''Probe CPU, memory, GPUs and every disk concurrently and return the snapshot as dictionary.
+
+    The names of failed or timed out probes are listed in the 'failed' entry of the snapshot.'''
+    # imported here, GPUtil and psutil are only needed for --specs
+    import socket
+    import platform
+    import psutil
+    import GPUtil
+
+    def system():
+        cpufreq = None
+        try:
+            cpufreq = psutil.cpu_freq()
+        except NotImplementedError:
+            pass
+        return {'system': platform.system(),
+                'release': platform.release(),
+                'version': platform.version(),
+                'host': socket.gethostname(),
+                'cpu': platform.processor(),
+                'physical_cores': psutil.cpu_count(logical=False),
+                'logical_cores': psutil.cpu_count(logical=True),
+                'max_frequency': cpufreq.max if cpufreq is not None else None,
+                'min_frequency': cpufreq.min if cpufreq is not None else None}
+
+    def memory():
+        return {'ram': psutil.virtual_memory().total, 'swap': psutil.swap_memory().total}
+
+    def gpus():
+        return [{'id': gpu.id, 'name': gpu.name, 'memory': gpu.memoryTotal} for gpu in GPUtil.getGPUs()]
+
+    def disk(partition):
+        usage = psutil.disk_usage(partition.mountpoint)
+        return {'device': partition.device,
+                'mountpoint': partition.mountpoint,
+                'fstype': partition.fstype,
+                'total': usage.total,
+                'used': usage.used,
+                'free': usage.free,
+                'percent': usage.percent}
+
+    probes = {'system': system, 'memory': memory, 'gpus': gpus}
+    for partition in psutil.disk_partitions():
+        if skip_netfs and partition.fstype.lower() in NETWORK_FILESYSTEMS:
+            log(f'Skipped network filesystem {partition.mountpoint} ({partition.fstype})')
             continue
-        diskstring += (f'-    Device: {partition.device}\n\t' + 
-                       f'-    Mountpoint: {partition.mountpoint}\n\t' + 
-                       f'-    Disk: {partition.fstype}\n\t' + 
-                       f'-    Total Size: {humanbytes(partition_usage.total)}\n\t' + 
-                       f'-    Used: {humanbytes(partition_usage.used)}\n\t' + 
-                       f'-    Free: {humanbytes(partition_usage.free)}\n\t' +
-                       f'-    Percentage: {partition_usage.percent}\n')
-
-    return ('## Project created on:\n' +
-            f'-    System: {platform.system()}\n' + 
-            f'-    Release: {platform.release()}\n' +
-            f'-    Version: {platform.version()}\n' +
-            f'-    Host: {socket.gethostname()}\n' +
-            f'-    CPU: {platform.processor()}\n' +
-            f'-    Physical Cores: {psutil.cpu_count(logical=False)}\n' +
-            f'-    Logical Cores: {psutil.cpu_count(logical=True)}\n' +
-            cpufreqstring + 
-            f'-    RAM: {humanbytes(svmem.total)}\n' +
-            f'-    Swap Memory: {humanbytes(swap.total)}\n' +
-            diskstring +
-            gpustring)
-
-def parseDoiToBib(doiFile, useLatex):
-    PREFIX_DX = 'http://dx.doi.org/'
-    PREFIX = 'http://doi.org/'
-    bibList = []
-    doiList = []
-    global warnings
+        probes[f'disk:{partition.mountpoint}'] = lambda partition=partition: disk(partition)
+
+    results, failed = runProbes(probes, timeout, warnings)
+    return {'system': results.get('system'),
+            'memory': results.get('memory'),
+            'gpus': results.get('gpus', []),
+            'disks': [results[name] for name in probes if name.startswith('disk:') and name in results],
+            'failed': failed}
+
+def renderSpecs(snapshot):
+    '''Return the markdown description of a snapshot from collectSpecs.'''
+    specs = '## Project created on:\n'
+
+    system = snapshot['system']
+    if system is not None:
+        specs += (f'-    System: {system["system"]}\n' + 
+                  f'-    Release: {system["release"]}\n' +
+                  f'-    Version: {system["version"]}\n' +
+                  f'-    Host: {system["host"]}\n' +
+                  f'-    CPU: {system["cpu"]}\n' +
+                  f'-    Physical Cores: {system["physical_cores"]}\n' +
+                  f'-    Logical Cores: {system["logical_cores"]}\n')
+        if system['max_frequency'] is not None:
+            specs += f'-    Max Frequency: {system["max_frequency"]:.2f}Mhz\n-    Min Frequency: {system["min_frequency"]:.2f}Mhz\n'
+        else:
+            specs += '-    Max Frequency: N/A\n-    Min Frequency: N/A\n'
 
-    with open(doiFile, 'r') as dois:
-        for doi in dois.readlines():
-            doi = doi.split('\n')[0]
-            log(f'Try to parse {doi}')
-            if doi.startswith('doi:'):
-                doi = doi.split('doi:')[1]
+    memory = snapshot['memory']
+    if memory is not None:
+        specs += (f'-    RAM: {humanbytes(memory["ram"])}\n' +
+                  f'-    Swap Memory: {humanbytes(memory["swap"])}\n')
 
-            if bool(re.search(r'\b(10[.][0-9]{4,}(?:[.][0-9]+)*\/(?:(?!["&\'<>])\S)+)\b', doi)):
-                doiList.append(doi)
+    for disk in snapshot['disks']:
+        specs += (f'-    Device: {disk["device"]}\n\t' + 
+                  f'-    Mountpoint: {disk["mountpoint"]}\n\t' + 
+                  f'-    Disk: {disk["fstype"]}\n\t' + 
+                  f'-    Total Size: {humanbytes(disk["total"])}\n\t' + 
+                  f'-    Used: {humanbytes(disk["used"])}\n\t' + 
+                  f'-    Free: {humanbytes(disk["free"])}\n\t' +
+                  f'-    Percentage: {disk["percent"]}\n')
+
+    for gpu in snapshot['gpus']:
+        specs += f'-    ID: {gpu["id"]}\n    -    GPU: {gpu["name"]}\n    -    Total memory: {gpu["memory"]}MB\n'
+
+    return specs
+
+def getSpecs(timeout=SPECS_TIMEOUT, skip_netfs=False, ttl=SPECS_TTL, cachedir=CACHE_DIR, warnings=None):
+    '''Return the hardware specs of this host as markdown.
 
-                if useLatex:
-                    if doi.startswith('http://doi.org/') or doi.startswith('https://dx.doi.org/'):
-                        doiURL = doi
+    A snapshot younger than ttl seconds is read from cachedir instead of probing the hardware again.
+    Only complete snapshots are cached, if a probe failed or timed out the next call probes again.'''
+    import json
+    import socket
+
+    cachefile = os.path.join(cachedir, f'specs_{socket.gethostname()}.json')
+    if ttl > 0 and os.path.isfile(cachefile):
+        try:
+            with open(cachefile, 'r') as r:
+                cached = json.load(r)
+            if time.time() - cached['time'] < ttl and cached['skip_netfs'] == skip_netfs:
+                log(f'Using hardware specs cached in {cachefile}')
+                return renderSpecs(cached['snapshot'])
+        except (ValueError, KeyError):
+            warn(f'Ignored corrupt hardware specs cache {cachefile}', warnings)
+
+    snapshot = collectSpecs(timeout=timeout, skip_netfs=skip_netfs, warnings=warnings)
+    if ttl > 0 and len(snapshot['failed']) > 0:
+        log(f'Hardware specs are not cached, probes {", ".join(snapshot["failed"])} did not succeed')
+    elif ttl > 0:
+        os.makedirs(cachedir, exist_ok=True)
+        writeAtomic(cachefile, json.dumps({'time': time.time(), 'skip_netfs': skip_netfs, 'snapshot': snapshot}), append=False)
+
+    return renderSpecs(snapshot)
+
+class DoiCache:
+    '''Persistent DOI to bibtex cache in a SQLite database with a TTL per entry and LRU eviction.
+
+    Every get and put is committed on its own, so concurrent runs only hold the write lock for one statement.
+    If the database fails, a warning is logged and the cache is disabled, the run continues without it.
+
+    Keyword arguments:
+    path -- Path of the SQLite database, created if it does not exist
+    ttl -- Seconds an entry stays valid after it was fetched
+    maxsize -- Maximum total size of all cached bibtex entries in bytes
+    warnings -- List the warnings are appended to'''
+
+    def __init__(self, path=DOI_CACHE, ttl=DOI_CACHE_TTL, maxsize=DOI_CACHE_SIZE, warnings=None):
+        import sqlite3
+
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.warnings = warnings
+        self.db = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+            # readers are not blocked by a writer and commits do not wait for fsync
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS bibtex (doi TEXT PRIMARY KEY, bibtex TEXT NOT NULL, size INTEGER NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)')
+        except (OSError, sqlite3.Error) as e:
+            self.disable(e)
+
+    def disable(self, e):
+        '''Log the database error e and continue without cache.'''
+        import sqlite3
+
+        warn(f'DOI cache {self.path} failed: {e}! Continuing without cache.', self.warnings)
+        if self.db is not None:
+            try:
+                self.db.close()
+            except sqlite3.Error:
+                pass
+        self.db = None
+
+    def key(self, doi, resolver):
+        '''Return the key of doi resolved by resolver, entries of the default resolver are keyed by the DOI only.'''
+        return doi.lower() if resolver == DOI_RESOLVER else f'{resolver} {doi.lower()}'
+
+    def get(self, doi, resolver=DOI_RESOLVER):
+        '''Return the cached bibtex of doi resolved by resolver or None if doi is not cached or expired.'''
+        import sqlite3
+
+        if self.db is None:
+            return None
+        now = time.time()
+        key = self.key(doi, resolver)
+        try:
+            row = self.db.execute('SELECT bibtex FROM bibtex WHERE doi = ? AND expires > ?', (key, now)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE bibtex SET accessed = ? WHERE doi = ?', (now, key))
+        except sqlite3.Error as e:
+            self.disable(e)
+            return None
+        return row[0]
+
+    def put(self, doi, bibtex, resolver=DOI_RESOLVER):
+        import sqlite3
+
+        if self.db is None:
+            return
+        now = time.time()
+        try:
+            self.db.execute('INSERT OR REPLACE INTO bibtex VALUES (?, ?, ?, ?, ?)', (self.key(doi, resolver), bibtex, len(bibtex.encode()), now + self.ttl, now))
+        except sqlite3.Error as e:
+            self.disable(e)
+
+    def evict(self):
+        '''Remove expired entries and the least recently used entries above maxsize in one transaction.'''
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            self.db.execute('DELETE FROM bibtex WHERE expires <= ?', (time.time(),))
+            total = 0
+            evicted = []
+            for doi, size in self.db.execute('SELECT doi, size FROM bibtex ORDER BY accessed DESC'):
+                total += size
+                if total > self.maxsize:
+                    evicted.append((doi,))
+            self.db.executemany('DELETE FROM bibtex WHERE doi = ?', evicted)
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        return len(evicted)
+
+    def close(self):
+        import sqlite3
+
+        if self.db is None:
+            return
+        try:
+            self.evict()
+            self.db.close()
+        except sqlite3.Error as e:
+            self.disable(e)
+        self.db = None
+
+def fetchBibtex(doi, resolver=DOI_RESOLVER, retries=DOI_RETRIES, backoff=DOI_BACKOFF, timeout=DOI_TIMEOUT):
+    '''Resolve doi to bibtex and return (doi, bibtex, status).
+
+    Failed requests are retried with exponential backoff and full jitter.
+    Status is 'ok', 'notfound' if the resolver does not know doi or 'failed' if all retries failed.
+
+    Keyword arguments:
+    doi -- DOI to resolve
+    resolver -- URL prefix the DOI is appended to
+    retries -- Maximum number of requests
+    backoff -- Base delay in seconds, doubled after every failed request
+    timeout -- Timeout of a single request in seconds'''
+    import urllib.request
+    from urllib.parse import quote
+    from urllib.error import HTTPError
+    from urllib.error import URLError
+    from http.client import HTTPException
+
+    req = urllib.request.Request(resolver.rstrip('/') + '/' + quote(doi, safe='/'))
+    req.add_header('Accept', 'application/x-bibtex')
+
+    for i in range(1, retries + 1):
+        PROFILE.count('http_requests')
+        if i > 1:
+            PROFILE.count('http_retries')
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as f:
+                bibtex = f.read().decode()
+            log(f'Successfully parsed {doi} after {i} tries')
+            return (doi, bibtex, 'ok')
+
+        except HTTPError as e:
+            if e.code == 404:
+                return (doi, None, 'notfound')
+            sys.stderr.write(f'\tService for {doi} unavailable ({e.code})! Retry {i}             \r')
+        except (URLError, OSError, HTTPException, UnicodeDecodeError) as e:
+            sys.stderr.write(f'\tError in {doi} ({e})! Retry {i}             \r')
+
+        if i < retries:
+            time.sleep(random.uniform(0, min(DOI_BACKOFF_MAX, backoff * 2 ** (i - 1))))
+
+    return (doi, None, 'failed')
+
+def normalizeDoi(text):
+    '''Return the DOI in text without resolver URL, "doi:" prefix and percent encoding or None if text contains no DOI.'''
+    if '%' in text:
+        from urllib.parse import unquote
+        text = unquote(text)
+    match = DOI_PATTERN.search(text)
+    if match is None:
+        return None
+    return match.group(1).rstrip('.,;')
+
+def referenceFormat(refFile):
+    '''Return the format of the reference list refFile, 'bib', 'ris', 'csv' or 'txt'.
+
+    The format is taken from the file extension, lists with another extension are recognized by their first line.'''
+    ext = os.path.splitext(refFile)[1].lower()
+    if ext in REFERENCE_FORMATS:
+        return REFERENCE_FORMATS[ext]
+    with open(refFile, 'r', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line == '':
+                continue
+            if line.startswith('@'):
+                return 'bib'
+            if RIS_PATTERN.match(line):
+                return 'ris'
+            break
+    return 'txt'
+
+def readBibtex(f):
+    '''Yield the entries of the bibtex file object f one at a time.
+
+    Entries start at @type{ and end at their closing brace, so entries spanning many lines and several entries in one line are both found.'''
+    parts = []
+    depth = 0
+    inEntry = False
+    for line in f:
+        pos = 0
+        while True:
+            if not inEntry:
+                match = BIB_START_PATTERN.search(line, pos)
+                if match is None:
+                    break
+                pos = match.start()
+                inEntry = True
+                parts = []
+            start = pos
+            for match in BIB_BRACE_PATTERN.finditer(line, pos):
+                depth += 1 if match.group() == '{' else -1
+                if depth == 0:
+                    pos = match.end()
+                    parts.append(line[start:pos])
+                    yield ''.join(parts)
+                    inEntry = False
+                    break
+            else:
+                parts.append(line[start:])
+                break
+    if inEntry and depth > 0:
+        yield ''.join(parts)
+
+def readReferences(refFile, warnings=None):
+    '''Yield (doi, key, bibtex) for every reference in refFile without reading it into memory.
+
+    refFile is a bibtex, RIS, CSV or plain text list with one DOI per line.
+    DOIs are normalized by normalizeDoi, key and bibtex are only set for bibtex entries with a title,
+    all other references have to be resolved by their DOI.'''
+    import csv
+
+    fmt = referenceFormat(refFile)
+    log(f'Reading {fmt} references from {refFile}')
+
+    if fmt == 'bib':
+        with open(refFile, 'r') as f:
+            for entry in readBibtex(f):
+                match = BIB_ENTRY_PATTERN.match(entry)
+                if match is None:
+                    warn(f'Error in parsing reference list {refFile}!\n\t{entry[:80].strip()} is no bibtex entry!', warnings)
+                    continue
+                if match.group(1).lower() in ('comment', 'preamble', 'string'):
+                    continue
+                doi = BIB_DOI_PATTERN.search(entry)
+                doi = normalizeDoi(doi.group(1)) if doi is not None else None
+                if BIB_TITLE_PATTERN.search(entry) is not None:
+                    yield (doi, match.group(2), entry.strip())
+                elif doi is not None:
+                    yield (doi, None, None)
+                else:
+                    warn(f'Bibtex entry {match.group(2)} in {refFile} has neither a title nor a DOI!', warnings)
+
+    elif fmt == 'ris':
+        doi = None
+        title = None
+        with open(refFile, 'r') as f:
+            for line in f:
+                match = RIS_PATTERN.match(line.lstrip('\ufeff'))
+                if match is None:
+                    continue
+                tag, value = match.groups()
+                if tag == 'TY':
+                    doi = None
+                    title = None
+                elif tag == 'DO' or (tag == 'UR' and doi is None):
+                    doi = normalizeDoi(value) or doi
+                elif tag in ('TI', 'T1') and title is None:
+                    title = value
+                elif tag == 'ER':
+                    if doi is not None:
+                        yield (doi, None, None)
                     else:
-                        doiURL = PREFIX + doi
-
-                    # Sometimes url doesnt load - retry at maximum 50 times
-                    for i in range(1, 21):
-                        req = urllib.request.Request(doiURL)
-                        req.add_header('Accept', 'application/x-bibtex')
-
-                        try:
-                            with urllib.request.urlopen(req) as f:
-                                bibtex = f.read().decode()
-                            bibList.append(bibtex)
-                            log(f'Successfully parsed {doi} after {i} tries')
-                            break
+                        warn(f'RIS record {title} in {refFile} has no DOI!', warnings)
+
+    elif fmt == 'csv':
+        with open(refFile, 'r', newline='') as f:
+            reader = csv.reader(f, delimiter='\t' if refFile.lower().endswith('.tsv') else ',')
+            header = [column.strip().lower() for column in next(reader, [])]
+            column = header.index('doi') if 'doi' in header else None
+            if column is None:
+                log(f'{refFile} has no doi column, searching all columns for DOIs')
+            for i, row in enumerate(reader, 2):
+                cells = row[column:column + 1] if column is not None else row
+                doi = next((doi for doi in map(normalizeDoi, cells) if doi is not None), None)
+                if doi is not None:
+                    yield (doi, None, None)
+                elif any(cell.strip() for cell in row):
+                    warn(f'Error in parsing reference list {refFile}!\n\tLine {i} contains no DOI!', warnings)
+
+    else:
+        with open(refFile, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line == '':
+                    continue
+                doi = normalizeDoi(line)
+                if doi is not None:
+                    yield (doi, None, None)
+                else:
+                    warn(f'Error in parsing doi list {refFile} to bib list!\n\t{line} does not match the doi syntax!', warnings)
+
+def renameBibtex(bibtex, keys):
+    '''Return bibtex with a citation key that is not in keys yet and add the key to keys.'''
+    match = BIB_ENTRY_PATTERN.match(bibtex)
+    if match is None:
+        return bibtex
+    key = match.group(2)
+    if key in keys:
+        base = key
+        i = 0
+        while key in keys:
+            key = base + (chr(ord('a') + i) if i < 26 else f'-{i}')
+            i += 1
+        bibtex = bibtex[:match.start(2)] + key + bibtex[match.end(2):]
+    keys.add(key)
+    return bibtex
+
+def bibtexKeys(refFile):
+    '''Return the citation keys of all complete bibtex entries in refFile, read as a stream.'''
+    keys = set()
+    if referenceFormat(refFile) != 'bib':
+        return keys
+    with open(refFile, 'r') as f:
+        for entry in readBibtex(f):
+            match = BIB_ENTRY_PATTERN.match(entry)
+            if match is not None and BIB_TITLE_PATTERN.search(entry) is not None:
+                keys.add(match.group(2))
+    return keys
+
+def parseDoiToBib(doiFile, useLatex, jobs=DOI_JOBS, resolver=DOI_RESOLVER, retries=DOI_RETRIES, cache=None, offline=False, refresh=False, warnings=None, bibFile=None):
+    '''Read the reference list doiFile and resolve the DOIs to bibtex concurrently if useLatex is set.
+
+    doiFile is a bibtex, RIS, CSV or plain text list of DOIs, see readReferences. It is read as a stream.
+    References are deduplicated by their DOI (case insensitive) and by their citation key,
+    only references without a complete bibtex entry are resolved.
+    Resolved entries with a citation key that is already used in doiFile get a suffix.
+    DOIs found in cache for resolver are not fetched again, unless refresh is set. In offline mode only cache is used.
+    Accepted bibtex entries are written to the open file bibFile in the order of doiFile as soon as they
+    and all entries before them are complete, only DOIs and citation keys are kept in memory.
+    Without bibFile the entries are only resolved, e.g. to fill cache.
+    Warnings are appended to the list warnings.
+    Returns (entries, doiList), the number of accepted bibtex entries and the DOIs in the order of doiFile.'''
+    from concurrent.futures import ThreadPoolExecutor
 
-                        except HTTPError as e:
-                            if e.code == 404:
-                                error(f'Error in parsing doi list {doiFile} to bib list!\n{doi} could not be found!', 9)
-                            else:
-                                sys.stderr.write(f'\tService for {doi} unavailable! Retry {i}             \r')
-                        except:
-                            sys.stderr.write(f'\tUnknown error in {doi}! Retry {i}             \r')
-
-                        if 'dx.doi.org' in doiURL:
-                            doiURL = PREFIX + doi
-                            continue
-                        else:
-                            doiURL = PREFIX_DX + doi
-                            continue
-                        log(f'\tWARNING: Could not parse {doi}!                 ')
-                        warnings += 1
+    doiList = []
+    dois = set()
+    keys = set()
+    # keys of all complete entries of doiFile, read once the first resolved entry is renamed
+    reserved = None
+    duplicates = 0
+    hits = 0
+    entries = 0
+
+    def finish(bibtex, future, resolved):
+        nonlocal entries, reserved
+        if future is not None:
+            doi, bibtex, status = future.result()
+            if status == 'notfound':
+                error(f'Error in parsing doi list {doiFile} to bib list!\n{doi} could not be found!', 9)
+            elif status == 'failed':
+                warn(f'Could not parse {doi} after {retries} tries!                 ', warnings)
+                return
+            if cache is not None:
+                cache.put(doi, bibtex, resolver=resolver)
+        if resolved:
+            # resolved entries must not take the key of any complete entry, also of a later one
+            if reserved is None:
+                reserved = bibtexKeys(doiFile)
+            bibtex = renameBibtex(bibtex.strip(), reserved)
+        if bibFile is not None:
+            bibFile.write(bibtex if entries == 0 else '\n' + bibtex)
+        entries += 1
+
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        # entries in the order of doiFile as (bibtex, future, resolved), the future is set while the DOI is fetched
+        pending = deque()
+        for doi, key, bibtex in readReferences(doiFile, warnings=warnings):
+            if doi is not None and doi.lower() in dois:
+                duplicates += 1
+                continue
+            if key is not None:
+                if key in keys:
+                    warn(f'Citation key {key} is used more than once in {doiFile}, only the first entry is kept!', warnings)
+                    duplicates += 1
+                    continue
+                keys.add(key)
+            if doi is not None:
+                dois.add(doi.lower())
+                doiList.append(doi)
+            if not useLatex:
+                continue
 
+            if bibtex is not None:
+                pending.append((bibtex, None, False))
             else:
-                warnings += 1
-                log(f'\tWARNING: Error in parsing doi list {doiFile} to bib list!\n\t{doi} does not match the doi syntax!')
-
-    return (bibList, doiList)
-
-def latex(project_name, project_dir, project_description, organization, author, orcid, supervisor, bibList):
-    log('Create latex files.')
-    latexPath = os.path.join(project_dir, 'doc')
-    log(f'Created {latexPath}')
-
-    # generate main.tex
-    with open(os.path.join(SCRIPTPATH, 'latex_template.tex'), 'r') as tex_template:
-        with open(os.path.join(latexPath, 'main.tex'), 'w+') as tex_main:
-            for line in tex_template.readlines():
-                tex_main.write(line)
-        tex_main.close()
-    tex_template.close()
-    log(f'Created {os.path.join(latexPath, "main.tex")}')
-
-    # generate title page
-    with open(os.path.join(latexPath, 'title_page.tex'), 'w+') as tex_title:
-        titleOrg = ''
-        if organization != '':
-            titleOrg = '\tOrganization:\\par\n\t{\\scshape\\Large ' + organization + '\\par}\n\t\\vfill\n'
+                cached = cache.get(doi, resolver=resolver) if cache is not None and not refresh else None
+                if cached is not None:
+                    hits += 1
+                    pending.append((cached, None, True))
+                elif offline:
+                    warn(f'{doi} is not cached and cannot be fetched in offline mode!', warnings)
+                else:
+                    pending.append((None, pool.submit(fetchBibtex, doi, resolver=resolver, retries=retries), True))
+
+            # pending requests are limited to keep memory flat for huge reference lists
+            while pending and (pending[0][1] is None or pending[0][1].done() or len(pending) > jobs * 4):
+                finish(*pending.popleft())
+        while pending:
+            finish(*pending.popleft())
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    log(f'Found {len(doiList)} DOIs in {doiFile}, skipped {duplicates} duplicates')
+    PROFILE.count('doi_duplicates', duplicates)
+    if hits > 0:
+        log(f'Found {hits} DOIs in cache')
+        PROFILE.count('doi_cache_hits', hits)
+
+    return (entries, doiList)
+
+def compileTemplate(text, source=''):
+    '''Compile text with {{variable}} placeholders and {{#variable}}...{{/variable}} sections, rendered only
+    if variable is not empty, and return its parts for renderTemplate.
+
+    Only names of TEMPLATE_VARIABLES are placeholders, other double braces like in LaTeX stay as they are.
+    Compiled parts are cached by the BLAKE2b digest of text, so every text is parsed once per process.
+
+    Keyword arguments:
+    text -- Content or path of a template file
+    source -- Name of the template file shown in errors'''
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    with TEMPLATE_LOCK:
+        parts = COMPILED_TEMPLATES.get(digest)
+    if parts is not None:
+        return parts
+
+    # text is kept as str, a variable as (name,) and a section as (name, parts)
+    stack = [(None, [])]
+    position = 0
+    for match in TEMPLATE_PATTERN.finditer(text):
+        kind, name = match.groups()
+        if name not in TEMPLATE_VARIABLES:
+            continue
+        if match.start() > position:
+            stack[-1][1].append(text[position:match.start()])
+        position = match.end()
+        if kind == '#':
+            stack.append((name, []))
+        elif kind == '/':
+            if stack[-1][0] != name:
+                error(f'Template {source} closes section {name} that is not open!', 24)
+            section, sectionparts = stack.pop()
+            stack[-1][1].append((section, tuple(sectionparts)))
+        else:
+            stack[-1][1].append((name,))
+    if len(stack) > 1:
+        error(f'Template {source} does not close section {stack[-1][0]}!', 24)
+    if position < len(text):
+        stack[0][1].append(text[position:])
+
+    parts = tuple(stack[0][1])
+    with TEMPLATE_LOCK:
+        # another thread may have compiled the same text meanwhile, keep one of the equal results
+        parts = COMPILED_TEMPLATES.setdefault(digest, parts)
+    return parts
+
+def renderPieces(parts, variables):
+    '''Render the parts of compileTemplate with the dictionary variables of TEMPLATE_VARIABLES.
+
+    A variable is a string or an open file whose content is not read into memory, e.g. bibtex.
+    Returns the rendered text as a list of strings and the open files in between.'''
+    pieces = []
+    for part in parts:
+        if isinstance(part, str):
+            piece = part
+        elif len(part) == 1:
+            piece = variables[part[0]]
+        elif variables[part[0]] != '':
+            pieces.extend(renderPieces(part[1], variables))
+            continue
+        else:
+            continue
+        if isinstance(piece, str) and len(pieces) > 0 and isinstance(pieces[-1], str):
+            pieces[-1] += piece
+        else:
+            pieces.append(piece)
+    return pieces
 
-        titleORCID = ''
-        if orcid != '':
-            titleORCID = f'\tORCID:\thttps://orcid.org/{orcid}\n'
-
-        tex_title.write('\\begin{titlepage}\n' + 
-                        '\t\\centering\n' + 
-                        '\t\\vfill\n' + 
-                        titleOrg +
-                        '\tProject:\\par\n' + 
-                        '\t{\\scshape\\large ' + project_name + '\\par}\n' +
-                        '\t\\vspace{1.5cm}\n' +
-                        '\t{\\huge\\bfseries ' + project_description + '\\par}\n' +
-                        '\t\\vfill\n' +
-                        '\tWritten by:\\par\n' + 
-                        '\t{\\large\\itshape ' + author + '\\par}\n' +
-                        titleORCID +
-                        '\t\\vfill\n' +
-                        '\tsupervised by \\par\n' +
-                        f'\t{supervisor}\n' +
-                        '\t\\vfill\n' +
-                        '\t{\\large \\today\\par}\n' + 
-                        '\\end{titlepage}')
-    tex_title.close()
-    log(f'Created {os.path.join(latexPath, "title_page.tex")}')
-
-    # generate abstract
-    with open(os.path.join(latexPath, 'abstract.tex'), 'w+') as tex_abstract:
-        tex_abstract.write('\\section*{Abstract}\n' +
-                           '\t\n' + 
-                           '\t% TODO: Write your abstract here')
-    tex_abstract.close()
-    log(f'Created {os.path.join(latexPath, "abstract.tex")}')
-
-    # generate abbreviations
-    with open(os.path.join(latexPath, 'abbreviations.tex'), 'w+') as tex_abbrev:
-        tex_abbrev.write('\\section*{\\Huge Abbreviations}\n' + 
-                         '\t\\begin{acronym}\n' +
-                         '\t\t\n' +
-                         '\t\t%TODO: add abbreviations here.\n' +
-                         '\t\t\n' + 
-                         '\t\\end{acronym}')
-    tex_abbrev.close()
-    log(f'Created {os.path.join(latexPath, "abbreviations.tex")}')
-
-    # prepare doc sections
-    sections = {'introduction.tex': 'Introduction',
-                'materials_methods.tex': 'Materials and Methods',
-                'results.tex': 'Results',
-                'discussion.tex': 'Discussion'}
-
-    # generate doc sections
-    for section in sections.keys():
-        with open(os.path.join(latexPath, section), 'w+') as tex_intro:
-            tex_intro.write('\\section{' + sections[section] + '}\n' + 
-                            '\n' + 
-                            f'\t% TODO: Write {sections[section].lower()} here.\n' + 
-                            '\t\n')
-        tex_intro.close()
-        log(f'Created {os.path.join(latexPath, section)}')
-
-    # generate attachments 
-    with open(os.path.join(latexPath, 'attachments.tex'), 'w+') as tex_attach:
-        tex_attach.write('\\section*{\\Huge Attachments}\n' + 
-                         '\t\n' +
-                         '\t% TODO: Add your attachments here.\n')
-    tex_attach.close()
-    log(f'Created {os.path.join(latexPath, "attachments.tex")}')
-
-    # generate citations
-    with open(os.path.join(latexPath, 'citations.bib'), 'w+') as tex_bib:
-        tex_bib.write('% Encoding: UTF-8\n')
-        for bibentry in bibList:
-            tex_bib.write(bibentry + '\n')
-        tex_bib.write('\n% TODO: Add your references here.')
-    tex_bib.close()
-    log(f'Created {os.path.join(latexPath, "citations.bib")}')
+def renderTemplate(parts, variables):
+    '''Render the parts of compileTemplate with the dictionary variables of TEMPLATE_VARIABLES and return the text.'''
+    return ''.join(renderPieces(parts, variables))
+
+class Template:
+    '''Project template, a directory containing template.json, files/ and optionally latex/.
+
+    template.json maps the project directories to their descriptions in README.md.
+    Every file below files/ is rendered into every project, every file below latex/ only with -tex,
+    both at the same relative path. Contents and paths may contain placeholders, see compileTemplate.
+    All files are compiled once when the template is loaded.
+
+    Keyword arguments:
+    path -- Directory of the template'''
+
+    def __init__(self, path):
+        import json
+
+        self.path = path
+        try:
+            with open(os.path.join(path, 'template.json'), 'r') as r:
+                config = json.load(r)
+            self.directories = dict(config['directories'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            error(f'Cannot read {os.path.join(path, "template.json")}: {e!r}', 24)
+        self.description = config.get('description', '')
+        self.files = self.compile('files')
+        self.latex = self.compile('latex')
+
+    def compile(self, subdir):
+        '''Return the compiled (path, content) of all files below subdir of the template.'''
+        root = os.path.join(self.path, subdir)
+        if not os.path.isdir(root):
+            return []
+        files = []
+        for reldir, depth, entries, dirs in scanTree(root):
+            for entry in entries:
+                path = os.path.join(reldir, entry.name)
+                with open(entry.path, 'r') as r:
+                    content = r.read()
+                files.append((compileTemplate(path, entry.path), compileTemplate(content, entry.path)))
+        return files
+
+    def paths(self, variables, latex=False):
+        '''Return the paths of all rendered files relative to the project.'''
+        return [renderTemplate(path, variables) for path, content in self.files + (self.latex if latex else [])]
+
+    def render(self, docs, project_dir, variables, latex=False):
+        '''Render all files into the buffers of docs, they are written with the other documents of the project.'''
+        for path, content in self.files + (self.latex if latex else []):
+            file = os.path.join(project_dir, renderTemplate(path, variables))
+            pieces = renderPieces(content, variables)
+            for piece in pieces:
+                docs.append(piece, file)
+            # every document ends with a newline
+            if len(pieces) == 0 or not isinstance(pieces[-1], str) or not pieces[-1].endswith('\n'):
+                docs.append('\n', file)
+            log(f'Created {file}')
+
+def loadTemplate(template=TEMPLATE):
+    '''Return the Template of template, a name of a directory in TEMPLATE_DIR or a path.
+
+    Loaded templates are cached per process and loaded again if one of their files changed.
+    A Template is not changed after loading, so one cached Template is shared by concurrent projects.'''
+    path = template if os.path.isdir(template) else os.path.join(TEMPLATE_DIR, template)
+    if not os.path.isfile(os.path.join(path, 'template.json')):
+        error(f'Cannot find template {template}, it has to be a directory with template.json or one of {", ".join(sorted(os.listdir(TEMPLATE_DIR)))}!', 24)
+
+    # one stat per file decides if the cached template is still valid
+    signature = tuple((os.path.join(reldir, entry.name), entry.stat().st_mtime_ns, entry.stat().st_size) for reldir, depth, entries, dirs in scanTree(path) for entry in entries)
+    key = os.path.abspath(path)
+    with TEMPLATE_LOCK:
+        cached = LOADED_TEMPLATES.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        loaded = Template(path)
+        LOADED_TEMPLATES[key] = (signature, loaded)
+    return loaded
+
+def runPhases(phases):
+    '''Run phases concurrently as soon as all phases they depend on are finished and return their results.
+
+    Start, end and duration of every phase and the phases running at the same time are logged.
+    An error in a phase is raised after the running phases finished.
+
+    Keyword arguments:
+    phases -- Dictionary of phase names and (function, dependencies), functions take no arguments'''
+    from concurrent.futures import ThreadPoolExecutor
+    from concurrent.futures import wait
+    from concurrent.futures import FIRST_COMPLETED
+
+    for name, (function, dependencies) in phases.items():
+        for dependency in dependencies:
+            if dependency not in phases:
+                raise ValueError(f'Phase {name} depends on unknown phase {dependency}')
+
+    results = {}
+    durations = {}
+    waiting = dict(phases)
+    running = {}
+    start = time.monotonic()
+
+    def run(name, function):
+        begin = time.monotonic()
+        log(f'Phase {name} started after {begin - start:.3f}s')
+        try:
+            with PROFILE.phase(name):
+                return function()
+        finally:
+            durations[name] = time.monotonic() - begin
+            log(f'Phase {name} finished in {durations[name]:.3f}s')
+
+    with ThreadPoolExecutor(max_workers=max(1, len(phases))) as pool:
+        while waiting or running:
+            ready = [name for name, (function, dependencies) in waiting.items() if all(dependency in results for dependency in dependencies)]
+            for name in ready:
+                running[pool.submit(run, name, waiting.pop(name)[0])] = name
+            if not running:
+                raise ValueError(f'Phases {", ".join(waiting)} have cyclic dependencies')
+            if ready:
+                log(f'Running {len(running)} phases concurrently: {", ".join(sorted(running.values()))}')
+
+            done, pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+
+    log(f'Finished {len(phases)} phases in {time.monotonic() - start:.3f}s, sequentially they took {sum(durations.values()):.3f}s')
+    return results
+
+def readBatchManifest(manifest):
+    '''Read the projects of a csv, json or yaml manifest and return them as list of dictionaries of argument names and values.
+
+    json and yaml manifests contain a list of projects or a mapping with a list of projects
+    and a mapping of defaults for all projects. In csv manifests list values are separated by ';'.'''
+    ext = os.path.splitext(manifest)[1].lower()
+    with open(manifest, 'r', newline='') as r:
+        if ext == '.csv':
+            import csv
+
+            projects = []
+            for row in csv.DictReader(r):
+                projects.append(dict((key.strip(), value.split(';') if ';' in value else value) for key, value in row.items() if key is not None and value is not None and value.strip() != ''))
+            return projects
+        elif ext == '.json':
+            import json
+
+            content = json.load(r)
+        elif ext in ('.yaml', '.yml'):
+            try:
+                # imported here, PyYAML is only needed for yaml manifests
+                import yaml
+            except ImportError:
+                error(f'Reading {manifest} needs PyYAML, use a csv or json manifest or install PyYAML!', 18)
+            content = yaml.safe_load(r)
+        else:
+            error(f'Manifest {manifest} has to be a csv, json or yaml file!', 18)
+
+    if isinstance(content, dict):
+        defaults = content.get('defaults', {})
+        content = [{**defaults, **project} for project in content.get('projects', [])]
+    if not isinstance(content, list) or not all(isinstance(project, dict) for project in content):
+        error(f'Manifest {manifest} has to contain a list of projects!', 18)
+    return content
+
+def configArgv(config):
+    '''Convert a project configuration, e.g. a project of a batch manifest, to command line arguments.'''
+    argv = []
+    for key, value in config.items():
+        option = f'--{key.lstrip("-")}'
+        if isinstance(value, str) and value.strip().lower() in ('true', 'yes', 'false', 'no'):
+            value = value.strip().lower() in ('true', 'yes')
+        if isinstance(value, bool):
+            if value:
+                argv.append(option)
+        elif isinstance(value, list) and key == 'gitignore':
+            for item in value:
+                argv.extend([option, str(item)])
+        elif isinstance(value, list):
+            argv.append(option)
+            argv.extend(str(item) for item in value)
+        elif value is not None:
+            argv.extend([option, str(value)])
+    return argv
+
+def stripBatchArgv(argv):
+    '''Remove the arguments only used by the --batch process from argv.'''
+    stripped = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in ('--batch', '--batch_jobs', '--profile', '--profile_dump'):
+            skip = True
+        elif arg.split('=')[0] not in ('--batch', '--batch_jobs', '--profile', '--profile_dump'):
+            stripped.append(arg)
+    return stripped
+
+def runBatchProject(argv, command, defaults):
+    '''Create one project of a batch in a worker process and return its result.
+
+    The log is collected and returned with the result, errors stop only this project.'''
+    import io
+    import traceback
+
+    start = time.monotonic()
+    result = {'argv': argv, 'code': 0, 'error': None, 'warnings': 0}
+    stderr = sys.stderr
+    sys.stderr = io.StringIO()
+    try:
+        args = parse_args(argv, defaults, parser_class=ConfigArgumentParser)
+        result['warnings'] = len(createProject(args, command).warnings)
+    except CreateProError as e:
+        sys.stderr.write(f'ERROR: {e}\n')
+        result['code'] = e.code
+        result['error'] = str(e)
+    except Exception as e:
+        traceback.print_exc()
+        result['code'] = 1
+        result['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        result['log'] = sys.stderr.getvalue()
+        sys.stderr = stderr
+
+    result['seconds'] = time.monotonic() - start
+    return result
+
+def runBatch(args, argv):
+    '''Create all projects of the manifest args.batch in a process pool and return the number of failed projects and warnings.
+
+    DOIs and hardware specs are fetched once before the projects are created,
+    every project reads them from the shared DOI cache and specs snapshot.'''
+    from concurrent.futures import as_completed
+
+    warnings = []
+    if args.batch_jobs is not None and args.batch_jobs < 1:
+        error(f'Number of batch jobs has to be at least 1!', 10)
+    if not os.path.isfile(args.batch):
+        error(f'Manifest {args.batch} is not a file!', 18)
+
+    projects = readBatchManifest(args.batch)
+    log(f'Found {len(projects)} projects in {args.batch}')
+
+    defaults = vars(args).copy()
+    defaults.update({'batch': None, 'profile': None, 'profile_dump': None})
+    common = stripBatchArgv(argv)
+    projectArgv = [configArgv(project) for project in projects]
+
+    # fill the shared DOI cache once instead of every project fetching the same DOIs
+    doiFiles = dict.fromkeys(project.get('doi', args.doi) for project, projectargv in zip(projects, projectArgv) if args.latex or '--latex' in projectargv)
+    doiFiles.pop(None, None)
+    if args.doi_cache != '' and not args.offline and len(doiFiles) > 0:
+        cache = DoiCache(args.doi_cache, ttl=args.doi_cache_ttl * 24 * 60 * 60, maxsize=args.doi_cache_size * 1024 ** 2, warnings=warnings)
+        try:
+            for doiFile in doiFiles:
+                if os.path.isfile(doiFile):
+                    try:
+                        parseDoiToBib(doiFile, True, jobs=args.doi_jobs, resolver=args.doi_resolver, retries=args.doi_retries, cache=cache, refresh=args.refresh, warnings=warnings)
+                    except CreateProError:
+                        warn(f'Could not fetch all DOIs of {doiFile}, the projects using it will report the error', warnings)
+        finally:
+            cache.close()
+        # already refreshed once for all projects
+        defaults['refresh'] = False
+
+    # probe the hardware once, the projects read the cached snapshot
+    if (args.specs or any('--specs' in projectargv for projectargv in projectArgv)) and args.specs_ttl > 0:
+        getSpecs(timeout=args.specs_timeout, skip_netfs=args.skip_netfs, ttl=args.specs_ttl, warnings=warnings)
+
+    results = [None] * len(projects)
+    with processPool(args.batch_jobs) as pool:
+        futures = {pool.submit(runBatchProject, projectArgv[i], common + projectArgv[i], defaults): i for i in range(len(projects))}
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            # logs of a project are written at once, so they do not interleave
+            sys.stderr.write(results[i]['log'])
+
+    failed = 0
+    for i, result in enumerate(results):
+        name = projects[i].get('project', projects[i].get('git', f'#{i + 1}'))
+        if result['code'] == 0:
+            log(f'Project {name} created in {result["seconds"]:.2f}s')
+        else:
+            failed += 1
+            log(f'\tFAILED: Project {name} stopped with error code {result["code"]} after {result["seconds"]:.2f}s: {result["error"]}')
+    log(f'Created {len(projects) - failed} of {len(projects)} projects of {args.batch}, {failed} failed')
+    return (failed, len(warnings) + sum(result['warnings'] for result in results))
+
+class ProjectResult:
+    '''Result of createProject.
+
+    project_dir -- Path of the created project
+    project_name -- Name of the project
+    files -- Generated documentation files
+    linked -- Dictionary of the linked resources/data ('data', 'traindata', 'valdata') and their (files, folders, size)
+    dois -- DOIs of the references
+    bibtex -- Number of DOIs resolved to bibtex
+    warnings -- List of warnings
+    seconds -- Wall time of the creation
+    tracked -- (files, size) tracked by git with --git, otherwise None
+    splits -- Dictionary of the splits of --split ('train', 'val', 'test') and their number of files'''
+
+    def __init__(self, project_dir, project_name, files, linked, dois, bibtex, warnings, seconds, tracked=None, splits=None):
+        self.project_dir = project_dir
+        self.project_name = project_name
+        self.files = files
+        self.linked = linked
+        self.dois = dois
+        self.bibtex = bibtex
+        self.warnings = warnings
+        self.seconds = seconds
+        self.tracked = tracked
+        self.splits = splits if splits is not None else {}
+
+    def __repr__(self):
+        return f'ProjectResult({self.project_dir!r}, files={len(self.files)}, linked={self.linked}, dois={len(self.dois)}, warnings={len(self.warnings)}, seconds={self.seconds:.3f})'
+
+def checkJobs(args):
+    if args.jobs is not None and args.jobs < 1:
+        error(f'Number of jobs has to be at least 1!', 10)
+
+    if args.hash_jobs is not None and args.hash_jobs < 1:
+        error(f'Number of hash jobs has to be at least 1!', 10)
+
+    if args.shard_jobs is not None and args.shard_jobs < 1:
+        error(f'Number of shard jobs has to be at least 1!', 10)
+
+def readmeLimits(args):
+    return {'max_entries': args.readme_max_entries, 'max_depth': args.readme_max_depth, 'max_lines': args.readme_max_lines}
 
 ### PARAMS
 
-def parse_args(args):
+class ConfigArgumentParser(ap.ArgumentParser):
+    '''ArgumentParser raising a CreateProError instead of printing or exiting, used for project configurations.
+
+    Help, usage and version of a configuration are errors, a library call must not write to stdout or exit.'''
+
+    def error(self, message):
+        raise CreateProError(message, 2)
 
-    parser = ap.ArgumentParser(
+    def exit(self, status=0, message=None):
+        raise CreateProError(message.strip() if message else 'A project configuration cannot ask for help or version!', 2)
+
+    def print_help(self, file=None):
+        raise CreateProError('A project configuration cannot ask for help!', 2)
+
+    def print_usage(self, file=None):
+        raise CreateProError('A project configuration cannot ask for the usage!', 2)
+
+    def _print_message(self, message, file=None):
+        # used by the version action before it exits
+        pass
+
+def parse_args(args, defaults=None, parser_class=ap.ArgumentParser):
+
+    parser = parser_class(
         description=f'{SCRIPT} helps you with Creating your PROject DIRectory with good structure for better navigation and reproducibility.',
         formatter_class=ap.HelpFormatter,
         epilog=f'You are currently using {SCRIPT} version {VERSION}!'
@@ -343,32 +2103,92 @@ def parse_args(args):
     # required arguments
     projectgroup = parser.add_mutually_exclusive_group(required=True)
     projectgroup.add_argument('-p', '--project', metavar='PATH_TO_PROJECT/PROJECT_NAME', default=None, type=str, help='Path and Name of the project you want to create locally. If the path does not exist, it will be created.')
+    projectgroup.add_argument('--verify', metavar='PATH_TO_PROJECT', type=str, default=None, help='Verify that the linked resources/data of an existing project still match their manifests. Only files with changed size or mtime are hashed again.')
     projectgroup.add_argument('-g', '--git', metavar='GIT_URL', type=str, default=None, help='Use this argument if you already made an empty repository and want to add your project to the remote repository.')
+    projectgroup.add_argument('--batch', metavar='MANIFEST', type=str, default=None, help='Create all projects listed in a csv, json or yaml manifest in parallel. Every project is given by the long names of the arguments, e.g. project, link or latex. All other arguments apply to every project.')
+    parser.add_argument('--batch_jobs', metavar='N', default=None, type=int, help='Number of processes creating the projects of --batch. Default is the number of CPUs.')
 
     # optional arguments
     parser.add_argument('-pd', '--project_description', metavar='SHORT_DESCRIPTION', default='', type=str, help='Short description about the project.')
     parser.add_argument('-l', '--link', metavar='PATH', type=str, default=None, help='Path of the folder of your resources/data.\nThe linked resources or data can be found in ./<project>/res/.')
     parser.add_argument('-ml', '--machine_learning', nargs=2, metavar=('TRAINDATA', 'VALDATA'), type=str, default=(None, None), help='Path to traindata and path to validationsdata.\nData gets linked into ./<project>/res/ folder.')
-    parser.add_argument('-i', '--gitignore', metavar='LIST', action='append', default=[], type=list, help='List of \'directories\' or \'files\' that should be ignored in git version control.\nOnly possible in combination with -g/--git!')
+    parser.add_argument('--shards', action='store_true', default=False, help='Pack the resources/data of -l/--link or -ml/--machine_learning into tar shards with an index instead of linking every file, for fast sequential and memory mapped reading of many small files. Read them with ShardReader of createPro.py.')
+    parser.add_argument('--shard_size', metavar='MB', default=SHARD_SIZE / 1024 ** 2, type=float, help=f'Maximum size of a shard of --shards in MB, larger files get a shard of their own. Default is {SHARD_SIZE // 1024 ** 2}.')
+    parser.add_argument('--shard_jobs', metavar='N', default=None, type=int, help='Number of processes packing the shards of --shards. Default is the number of CPUs.')
+    parser.add_argument('--split', metavar='DATASET', type=str, default=None, help='Path to a dataset that is split into train, validation and optionally test data by the hash of the file paths. The splits are written as file lists to ./<project>/res/splits/, no file is linked.')
+    parser.add_argument('--split_ratios', metavar='RATIO', nargs='+', default=list(SPLIT_RATIOS), type=float, help=f'Two or three ratios of train, validation and test data of --split, e.g. 0.8 0.1 0.1 or 8 1 1. Default is {" ".join(map(str, SPLIT_RATIOS))}.')
+    parser.add_argument('--split_seed', metavar='STRING', default='', type=str, help='Seed of the --split hash, the same seed gives the same split on every machine.')
+    parser.add_argument('--stratify', action='store_true', default=False, help='Split every top level subdirectory of --split, e.g. every class, exactly by the ratios.')
+    parser.add_argument('--depth', metavar='N', default=None, type=int, help='Clone only the last N commits of the --git repository.')
+    parser.add_argument('--filter', metavar='FILTER', default=None, type=str, help='Partial clone of the --git repository, e.g. blob:none downloads the file contents of the checked out commit only. The remote has to allow filters.')
+    parser.add_argument('-i', '--gitignore', metavar='LIST', action='append', default=[], type=str, help='List of \'directories\' or \'files\' that should be ignored in git version control.\nOnly possible in combination with -g/--git!')
+    parser.add_argument('--git_max_files', metavar='N', default=GIT_MAX_FILES, type=int, help=f'With --git, linked resources/data with more than N files are added to .gitignore, only the READMEs stay tracked. Use 0 to disable. Default is {GIT_MAX_FILES}.')
+    parser.add_argument('--git_max_size', metavar='MB', default=GIT_MAX_SIZE / 1024 ** 2, type=float, help=f'With --git, linked resources/data larger than MB are added to .gitignore, only the READMEs stay tracked. Use 0 to disable. Default is {GIT_MAX_SIZE // 1024 ** 2}.')
+    parser.add_argument('--git_max_file_size', metavar='MB', default=GIT_MAX_FILE_SIZE / 1024 ** 2, type=float, help=f'With --git, linked files larger than MB are added to .gitignore. Use 0 to disable. Default is {GIT_MAX_FILE_SIZE // 1024 ** 2}.')
+    parser.add_argument('--git_track_data', action='store_true', default=False, help='Do not add linked resources/data to .gitignore automatically.')
     parser.add_argument('-a', '--author', metavar='NAME', default=None, type=str, help='Name of the author of the project in quotation marks: "Forename ... Surname".')
     parser.add_argument('-s', '--supervisor', metavar='NAME', default='', type=str, help='Name of the supervisor in quotation marks: "Forename ... Surname".')
     parser.add_argument('-org', '--organization', metavar='STRING', default='', type=str, help='Name of the organization in quotation marks: "...".')
     parser.add_argument('-oid', '--orcid', metavar='ORCID', default='', type=str, help='ORCID of the author of the project. Should look like XXXX-XXXX-XXXX-XXXX.')
     parser.add_argument('-tex', '--latex', action='store_true', default=False, help='Use this parameter to generate latex files for project work.')
+    parser.add_argument('-T', '--template', metavar='NAME_OR_PATH', default=TEMPLATE, type=str, help=f'Template of the directories, README files and latex files of the project, a name of a directory in {TEMPLATE_DIR} or a path to a directory with template.json. Default is {TEMPLATE}.')
     parser.add_argument('-sp','--specs', action='store_true', default=False, help='Use this parameter to generate hardware specs in your docfile.')
-    parser.add_argument('-d', '--doi', metavar='DOI_FILE.txt', default=None, type=str, help='File containing all DOIs you want to use as references in the README.md and latex bib file. Only one DOI per line!')
+    parser.add_argument('--specs_timeout', metavar='SECONDS', default=SPECS_TIMEOUT, type=float, help=f'Maximum time for every hardware probe of --specs, probes run concurrently. Default is {SPECS_TIMEOUT}.')
+    parser.add_argument('--specs_ttl', metavar='SECONDS', default=SPECS_TTL, type=float, help=f'Reuse the hardware specs of this host for this many seconds. Use 0 to disable the cache. Default is {SPECS_TTL}.')
+    parser.add_argument('--skip_netfs', action='store_true', default=False, help='Skip network filesystems like NFS or Lustre in the hardware specs.')
+    parser.add_argument('--readme_max_entries', metavar='N', default=README_MAX_ENTRIES, type=int, help=f'List at most N entries per directory in the data section of README.md, the others are summarized in one line. Use 0 to list all. Default is {README_MAX_ENTRIES}.')
+    parser.add_argument('--readme_max_depth', metavar='N', default=README_MAX_DEPTH, type=int, help=f'List directories up to depth N in the data section of README.md, deeper ones are summarized. Use 0 to list all. Default is {README_MAX_DEPTH}.')
+    parser.add_argument('--readme_max_lines', metavar='N', default=README_MAX_LINES, type=int, help=f'List at most N files and directories in the data section of README.md. Use 0 to list all. Default is {README_MAX_LINES}. All files are listed in doc/data_index_<dir>.txt.gz.')
+    parser.add_argument('-ls', '--link_strategy', choices=['auto'] + list(LINK_FUNCTIONS.keys()), default='auto', help='How resources/data are linked into the project. auto uses hard links and falls back to reflinks and copies if the data is on another filesystem. Default is auto.')
+    parser.add_argument('-cs', '--checksums', action='store_true', default=False, help='Record BLAKE2b checksums of all linked files in the manifest, so --verify can detect modified files.')
+    parser.add_argument('-hj', '--hash_jobs', metavar='N', default=None, type=int, help='Number of processes computing checksums. Default is the number of CPUs.')
+    parser.add_argument('--rehash', action='store_true', default=False, help='Hash all files with --verify, not only files with changed size or mtime.')
+    parser.add_argument('--sync', action='store_true', default=False, help='Link new and changed resources/data into the existing project given by -p/--project, remove links of deleted files and update the data section of README.md.')
+    parser.add_argument('-j', '--jobs', metavar='N', default=None, type=int, help='Number of threads used to link resources/data. Default is the number of CPUs + 4, at most 32.')
+    parser.add_argument('-d', '--doi', metavar='REFERENCES', default=None, type=str, help='Reference list you want to use as references in the README.md and latex bib file. Either a bibtex (.bib), RIS (.ris) or CSV (.csv/.tsv with a doi column) export or a text file with one DOI per line. Duplicates are removed, only entries without bibtex are resolved.')
+    parser.add_argument('-dj', '--doi_jobs', metavar='N', default=DOI_JOBS, type=int, help=f'Number of DOIs resolved to bibtex at the same time. Default is {DOI_JOBS}.')
+    parser.add_argument('-dr', '--doi_resolver', metavar='URL', default=DOI_RESOLVER, type=str, help=f'URL the DOIs are appended to for resolving them to bibtex. Default is {DOI_RESOLVER}.')
+    parser.add_argument('--offline', action='store_true', default=False, help='Use only cached bibtex entries and do not fetch DOIs from the network.')
+    parser.add_argument('--refresh', action='store_true', default=False, help='Fetch all DOIs from the network again and update the cache.')
+    parser.add_argument('--doi_cache', metavar='PATH', default=DOI_CACHE, type=str, help=f'SQLite database used as DOI to bibtex cache. Use \'\' to disable the cache. Default is {DOI_CACHE}.')
+    parser.add_argument('--doi_cache_ttl', metavar='DAYS', default=DOI_CACHE_TTL / (24 * 60 * 60), type=float, help=f'Days a cached bibtex entry stays valid. Default is {DOI_CACHE_TTL // (24 * 60 * 60)}.')
+    parser.add_argument('--doi_cache_size', metavar='MB', default=DOI_CACHE_SIZE / 1024 ** 2, type=float, help=f'Maximum size of the DOI cache in MB, least recently used entries are removed first. Default is {DOI_CACHE_SIZE // 1024 ** 2}.')
+    parser.add_argument('--doi_retries', metavar='N', default=DOI_RETRIES, type=int, help=f'Maximum number of requests per DOI, failed requests are retried with exponential backoff. Default is {DOI_RETRIES}.')
+    parser.add_argument('--profile', metavar='REPORT.json', default=None, type=str, help='Write a JSON report with the wall time of every phase, counters of linked, stat\'d and hashed files, HTTP requests and retries and the peak RSS.')
+    parser.add_argument('--profile_dump', metavar='FILE.prof', default=None, type=str, help='Profile the run with cProfile and write the stats to FILE.prof, readable with pstats or snakeviz.')
         
     parser.add_argument('-v', '--version', action='version', version=f'\n%(prog)s {VERSION}')
 
-    return parser.parse_args()
-
-def main():
-
-    log(f'STARTING {SCRIPT}')
-
-    args = parse_args(sys.argv[1:])
-
+    # arguments given to --batch apply to every project of the manifest
+    if defaults is not None:
+        parser.set_defaults(**defaults)
+
+    return parser.parse_args(args)
+
+def createProject(config, argv=None):
+    '''Create a project and return a ProjectResult.
+
+    Errors raise a CreateProError. All state is kept per call, so projects can be created
+    concurrently from several threads of one process.
+
+    Keyword arguments:
+    config -- Dictionary of the long argument names and values, like a project of a --batch manifest, or parsed arguments
+    argv -- Arguments recorded as command in README.sh, default are the arguments given by config'''
+    if isinstance(config, dict):
+        if argv is None:
+            argv = configArgv(config)
+        args = parse_args(configArgv(config), parser_class=ConfigArgumentParser)
+    else:
+        args = config
+        if argv is None:
+            argv = []
+    if args.project is None and args.git is None:
+        error(f'A project needs a path or git url!', 2)
+
+    start = time.monotonic()
+    warnings = []
     activeParams = {'latex': args.latex, 'specs': args.specs}
+    docs = Documents()
 
     datalink = args.link
     project_description = args.project_description
@@ -377,8 +2197,9 @@ def main():
     orcid = args.orcid
     trainlink = args.machine_learning[0]
     vallink = args.machine_learning[1]
+    splitlink = args.split
     author = getpass.getuser()
-    time = datetime.now().strftime("%Y.%m.%d %H:%M:%S")
+    date = datetime.now().strftime("%Y.%m.%d %H:%M:%S")
 
     ### CHECK INPUT
     projectInput = {'local': False, 'git': False}
@@ -400,14 +2221,17 @@ def main():
         projectInput['git'] = True
         log(f'Using git {giturl} for version control!')
 
-    bibList = []
-    doiList = []
-    if args.doi is not None:
-        if os.path.isfile(args.doi):
-            log(f'Start parsing {args.doi}')
-            bibList, doiList = parseDoiToBib(args.doi, activeParams['latex'])
-        else:
-            error(f'List of DOIs {args.doi} is not a file!', 8)
+    checkJobs(args)
+    readme_limits = readmeLimits(args)
+
+    if args.doi_jobs < 1 or args.doi_retries < 1:
+        error(f'Number of DOI jobs and retries has to be at least 1!', 11)
+
+    if args.offline and args.refresh:
+        error(f'Cannot use --offline and --refresh together!', 12)
+
+    if args.doi is not None and not os.path.isfile(args.doi):
+        error(f'List of DOIs {args.doi} is not a file!', 8)
 
     ### CREATE PROJECT DIRECTORY
 
@@ -427,148 +2251,415 @@ def main():
     if vallink is not None and not os.path.exists(vallink):
         error(f'Cannot find path to validation data!', 5)
 
+    if splitlink is not None and (datalink is not None or trainlink is not None):
+        error(f'Cannot use --split together with --link or --machine_learning! Please choose only one of them!', 3)
+
+    if splitlink is not None and not os.path.isdir(splitlink):
+        error(f'Cannot find the dataset directory {splitlink} to split!', 21)
+
+    if len(args.split_ratios) not in (2, 3) or min(args.split_ratios) <= 0:
+        error(f'--split_ratios needs two or three positive ratios!', 22)
+
+    if args.shards and datalink is None and trainlink is None:
+        error(f'Can use --shards only with --link or --machine_learning!', 23)
+
+    if args.shard_size <= 0:
+        error(f'Shard size has to be positive!', 23)
+
     if len(args.gitignore) > 0 and args.git is None:
         error(f'Can use --gitignore only if --git is used!', 6)
 
+    if (args.depth is not None or args.filter is not None) and args.git is None:
+        error(f'Can use --depth and --filter only if --git is used!', 6)
+
+    if args.depth is not None and args.depth < 1:
+        error(f'Clone depth has to be at least 1!', 10)
+
     # check if orcid syntax and checksum
     if args.orcid != '':
         if not isORCID(orcid):
             error('ORCID does not match standards!', 7)
 
-    if projectInput['git']:
-        repo = git.Repo.clone_from(giturl, project_dir)
+    readmemd = os.path.join(project_dir, 'README.md')
+    readmesh = os.path.join(project_dir, 'README.sh')
+    gitignore = os.path.join(project_dir, '.gitignore')
+    gitMaxSize = int(args.git_max_size * 1024 ** 2)
+    gitMaxFileSize = int(args.git_max_file_size * 1024 ** 2)
+    template = loadTemplate(args.template)
+    # paths of the template files do not depend on bibtex, it is set after the doi phase
+    variables = {'project_name': project_name,
+                 'project_description': project_description,
+                 'author': author,
+                 'orcid': orcid,
+                 'supervisor': supervisor,
+                 'organization': organization,
+                 'date': date,
+                 'script': SCRIPT,
+                 'version': VERSION,
+                 'bibtex': ''}
+    templateFiles = template.paths(variables, latex=activeParams['latex'])
+
+    ### PHASES
+    # independent phases run concurrently, every phase writes into its own documents
+    # that are assembled in a fixed order afterwards
+
+    def parseDois():
+        if args.doi is None:
+            return (None, 0, [])
+        log(f'Start parsing {args.doi}')
+        cache = None
+        spool = None
+        if activeParams['latex']:
+            import tempfile
+
+            # bibtex entries are spooled to disk and copied into the citations when the documents are written
+            spool = tempfile.TemporaryFile('w+')
+            if args.doi_cache != '':
+                cache = DoiCache(args.doi_cache, ttl=args.doi_cache_ttl * 24 * 60 * 60, maxsize=args.doi_cache_size * 1024 ** 2, warnings=warnings)
+        try:
+            entries, dois = parseDoiToBib(args.doi, activeParams['latex'], jobs=args.doi_jobs, resolver=args.doi_resolver, retries=args.doi_retries, cache=cache, offline=args.offline, refresh=args.refresh, warnings=warnings, bibFile=spool)
+        except BaseException:
+            if spool is not None:
+                spool.close()
+            raise
+        finally:
+            if cache is not None:
+                cache.close()
+        return (spool, entries, dois)
+
+    def createDirectories():
+        repo = None
+        if projectInput['git']:
+            # imported here, GitPython is only needed for --git
+            import git
+
+            clone = {}
+            if args.depth is not None:
+                clone['depth'] = args.depth
+            if args.filter is not None:
+                clone['filter'] = args.filter
+            url = giturl
+            if len(clone) > 0 and os.path.isdir(giturl):
+                # git ignores --depth and --filter for plain local paths
+                url = f'file://{os.path.abspath(giturl)}'
+            # git clones into the empty project_dir claimed before the phases
+            try:
+                repo = git.Repo.clone_from(url, project_dir, **clone)
+            except git.exc.GitCommandError as e:
+                # GitPython quotes the output of git as "stderr: '...'"
+                message = (e.stderr or str(e)).strip().replace('stderr: ', '', 1).strip("'").strip()
+                error(f'Cannot clone {giturl}: {message}', 20)
+        log(f'Created project \"{project_name}\" directory in {project_dir}')
+
+        # making directories
+        for dire in template.directories:
+
+            # check if path already exists
+            if os.path.exists(os.path.join(project_dir, dire)):
+                log(f'Path {os.path.join(project_dir, dire)} already exists!')    
+            else:
+                os.makedirs(os.path.join(project_dir, dire))
+                log(f'Created {os.path.join(project_dir, dire)}')
+
+        # template files may be placed in directories without description
+        for file in templateFiles:
+            os.makedirs(os.path.join(project_dir, os.path.dirname(file)), exist_ok=True)
+
+        # if no datalink provided create train and validate data folders
+        if trainlink is not None or vallink is not None:
+            for dire in ('traindata', 'valdata'):
+                os.makedirs(os.path.join(project_dir, 'res', dire))
+                log(f'Created {os.path.join(project_dir, "res", dire)}')
+        if splitlink is not None:
+            os.makedirs(os.path.join(project_dir, 'res', 'splits'))
+            log(f'Created {os.path.join(project_dir, "res", "splits")}')
+        return repo
+
+    def specsPhase():
+        return getSpecs(timeout=args.specs_timeout, skip_netfs=args.skip_netfs, ttl=args.specs_ttl, warnings=warnings)
+
+    def packData(walkpath, dst, label, name):
+        phasedocs = Documents()
+        os.makedirs(dst, exist_ok=True)
+        shardSize = int(args.shard_size * 1024 ** 2)
+        (files, folders, datasize, shards) = packShards(walkpath, dst, shard_size=shardSize, jobs=args.shard_jobs)
+        readmedst = os.path.join(os.sep, os.path.relpath(dst, project_dir))
+        phasedocs.write(f'Resources/Data packed from<br>\n{os.path.abspath(walkpath)}<br>', readmemd)
+        phasedocs.write(f'<!-- createPro shards {os.path.relpath(dst, project_dir)} -->', readmemd)
+        # the data tree lists the shards instead of every file
+        tree = DataTree(phasedocs, readmemd, readmedst, **readme_limits)
+        tree.add(('d', '.', 0, 0, 0, NO_HASH))
+        for shard, shardfiles, shardsize in shards:
+            tree.add(('f', shard, 0, shardsize, 0, NO_HASH))
+        tree.finish()
+        phasedocs.write(f'Packed {label}{files} files in {folders} folders with a total datasize of {humanbytes(datasize)} into {len(shards)} shards of at most {humanbytes(shardSize)}.<br>', readmemd)
+        phasedocs.write(f'{SHARD_NAMES}.txt lists the paths of all samples and {SHARD_NAMES}.idx the byte offsets of its lines, {SHARD_INDEX} holds shard, offset and size of every sample as little-endian uint64. Read the samples with ShardReader(\'{readmedst.lstrip(os.sep)}\') of createPro.py.<br>', readmemd)
+        phasedocs.write(f'<!-- createPro shards end {os.path.relpath(dst, project_dir)} -->', readmemd)
+        log(f'Packed {name}: {files} files in {len(shards)} shards of size {humanbytes(datasize)}')
+        linked[name] = (files, folders, datasize)
+
+        # keep large shards out of git like linked resources/data
+        if projectInput['git']:
+            rel = os.path.relpath(dst, project_dir)
+            packedsize = sum(shardsize for shard, shardfiles, shardsize in shards)
+            ignoreAll = not args.git_track_data and ((args.git_max_files > 0 and len(shards) > args.git_max_files) or (gitMaxSize > 0 and packedsize > gitMaxSize))
+            if ignoreAll:
+                log(f'Ignoring the shards of {rel} in git, {len(shards)} shards with {humanbytes(packedsize)}')
+                phasedocs.write(f'{gitignorePattern(rel)}/shard-*.tar', gitignore)
+            for shard, shardfiles, shardsize in shards:
+                if ignoreAll:
+                    continue
+                if not args.git_track_data and gitMaxFileSize > 0 and shardsize > gitMaxFileSize:
+                    phasedocs.write(gitignorePattern(os.path.join(rel, shard)), gitignore)
+                else:
+                    indexes[f'{name}_{shard}'] = os.path.join(dst, shard)
+            # the index of the samples is committed unless it is too large itself
+            for index in (SHARD_INDEX, f'{SHARD_NAMES}.txt', f'{SHARD_NAMES}.idx'):
+                path = os.path.join(dst, index)
+                if not args.git_track_data and gitMaxFileSize > 0 and os.path.getsize(path) > gitMaxFileSize:
+                    phasedocs.write(gitignorePattern(os.path.relpath(path, project_dir)), gitignore)
+                else:
+                    indexes[f'{name}_{index}'] = path
+        return phasedocs
+
+    def linkData(walkpath, dst, label, name):
+        if args.shards:
+            return packData(walkpath, dst, label, name)
+        phasedocs = Documents()
+        os.makedirs(dst, exist_ok=True)
+        phasedocs.write(f'Resources/Data linked from<br>\n{os.path.abspath(walkpath)}<br>', readmemd)
+        (files, folders, datasize) = linkAllFiles(docs=phasedocs, project_dir=project_dir, readmemd=readmemd, walkpath=walkpath, dst=dst, jobs=args.jobs, label=label, checksums=args.checksums, hash_jobs=args.hash_jobs, strategy=args.link_strategy, readme_limits=readme_limits)
+        log(f'Linked {name}: {files} files in {folders} folders.')
+        log(f'Linked {name} of size {humanbytes(datasize)}')
+        linked[name] = (files, folders, datasize)
+
+        # keep large resources/data out of git, the READMEs stay tracked
+        if projectInput['git'] and not args.git_track_data:
+            keep = templateFiles
+            for pattern in gitignoreData(project_dir, dst, files, datasize, keep=keep, max_files=args.git_max_files, max_size=gitMaxSize, max_file_size=gitMaxFileSize):
+                phasedocs.write(pattern, gitignore)
+
+            # the listing of all files is committed unless it is too large itself
+            index = indexPath(project_dir, dst)
+            if gitMaxFileSize > 0 and os.path.getsize(index) > gitMaxFileSize:
+                phasedocs.write(gitignorePattern(os.path.relpath(index, project_dir)), gitignore)
+            else:
+                indexes[name] = index
+        return phasedocs
+
+    def splitDataset():
+        phasedocs = Documents()
+        dst = os.path.join(project_dir, 'res', 'splits')
+        counts = splitData(splitlink, dst, ratios=args.split_ratios, seed=args.split_seed, stratify=args.stratify)
+        total = sum(files for name, files in counts)
+        phasedocs.write(f'Resources/Data split from<br>\n{os.path.abspath(splitlink)}<br>', readmemd)
+        phasedocs.write(f'Split {total} files by the BLAKE2b hash of their relative paths with seed \'{args.split_seed}\'' + (', every top level subdirectory separately' if args.stratify else '') + '.<br>', readmemd)
+        for (name, files), ratio in zip(counts, args.split_ratios):
+            phasedocs.write(f'``|--> /res/splits/{name}.txt`` {files} files, ratio {ratio / sum(args.split_ratios):.3g}<br>', readmemd)
+        phasedocs.write(f'Every .txt lists the paths relative to the dataset, the .idx next to it holds the byte offsets of all lines as little-endian uint64.<br>', readmemd)
+        log(f'Split {total} files into ' + ', '.join(f'{files} {name}' for name, files in counts))
+        splits.update(counts)
+
+        # large lists stay out of git, they can be created again from the dataset with the same seed
+        if projectInput['git']:
+            for name, files in counts:
+                for extension in ('txt', 'idx'):
+                    path = os.path.join(dst, f'{name}.{extension}')
+                    if not args.git_track_data and gitMaxFileSize > 0 and os.path.getsize(path) > gitMaxFileSize:
+                        phasedocs.write(gitignorePattern(os.path.relpath(path, project_dir)), gitignore)
+                    else:
+                        indexes[f'split_{name}.{extension}'] = path
+        return phasedocs
+
+    linked = {}
+    indexes = {}
+    splits = {}
 
-    if projectInput['local']:
+    phases = {'doi': (parseDois, []), 'create': (createDirectories, [])}
+    if activeParams['specs']:
+        phases['specs'] = (specsPhase, [])
+    if trainlink is not None:
+        phases['traindata'] = (lambda: linkData(trainlink, os.path.join(project_dir, 'res', 'traindata'), 'traindata: ', 'traindata'), ['create'])
+    if vallink is not None:
+        phases['valdata'] = (lambda: linkData(vallink, os.path.join(project_dir, 'res', 'valdata'), 'validationdata: ', 'validationdata'), ['create'])
+    if datalink is not None:
+        phases['data'] = (lambda: linkData(datalink, os.path.join(project_dir, 'res'), '', 'data'), ['create'])
+    if splitlink is not None:
+        phases['split'] = (splitDataset, ['create'])
+
+    # claim project_dir, of concurrent calls for the same path only one creates it
+    try:
         os.makedirs(project_dir)
+    except FileExistsError:
+        error(f'Path {project_dir} already exists!\nStopped with error code 1!', 1)
 
-    if projectInput['git']:
-        for f in args.gitignore:
-            write(f, project_dir + '.gitignore')
+    try:
+        results = runPhases(phases)
+        bibFile, bibtexs, doiList = results['doi']
+        repo = results['create']
+
+        ### CREATE PROJECT FILES
+
+        if projectInput['git']:
+            for f in args.gitignore:
+                docs.write(f, gitignore)
+            # manifests contain absolute paths of this machine
+            if len(linked) > 0 and not args.git_track_data:
+                docs.write(f'/{MANIFEST_DIR}/', gitignore)
+
+        if activeParams['latex']:
+            log('Create latex files.')
+        variables['bibtex'] = bibFile if bibtexs > 0 else ''
+        template.render(docs, project_dir, variables, latex=activeParams['latex'])
+
+        command = f'{SCRIPT} '
+        for arg in argv:
+            if arg.startswith('-'):
+                command += f'{arg} '
+            else:
+                command += f'\'{arg}\' '
 
-    readmemd = os.path.join(project_dir, 'README.md')
-    readmesh = os.path.join(project_dir, 'README.sh')
-    log(f'Created project \"{project_name}\" directory in {project_dir}')
+        # writing major readme file
+        docs.write(f'# Project \'{project_name}\' created on {date} from {author}.', readmemd, readmesh)
+        docs.write(f'# with {SCRIPT} version {VERSION}.', readmesh)
+        docs.write(f'# Used the following command in {os.getcwd()}', readmesh)
+        docs.write(command, readmesh)
 
-    # making directories
-    readmes = {}
-    project_dirs = ['src', 'res', 'bin', 'lib', 'doc', 'build', 'out', 'out/plots', 'temp']
-    for dire in project_dirs:
+        if projectInput['git']:
+            docs.write(f'# Using git {giturl} for version control on account {git_user_name} on {git_service}.', readmesh)
+            docs.write(f'-    Using git {giturl} for version control on account {git_user_name} on {git_service}.', readmemd)
 
-        # check if path already exists
-        if os.path.exists(os.path.join(project_dir, dire)):
-            log(f'Path {os.path.join(project_dir, dire)} already exists!')    
-        else:
-            os.makedirs(os.path.join(project_dir, dire))
-            log(f'Created {os.path.join(project_dir, dire)}')
-        
-        # dont create readmes for out/plots and doc
-        if dire != 'out/plots' and dire != 'doc':
-            readmes[dire] = os.path.join(project_dir, dire, 'README.md')
-            write(f'<!-- Created markdown file for {os.path.join(dire, "")} on {time} from {author} with {SCRIPT} from https://github.com/JannesSP/sciProTools. -->', readmes[dire])
-            log(f'Created {readmes[dire]}')
+        docs.write(f'-    Created with {SCRIPT} version {VERSION} from https://github.com/JannesSP/sciProTools.', readmemd)
+        docs.write(f'<pre>\n{command}\n</pre>', readmemd)
 
-    write(f'res contains the resource data the way you like, either the hard links to your resource data or the actual resource data files.', readmes['res'])
+        if orcid != '':
+            docs.write(f'-    ORCID of the author: https://orcid.org/{orcid}', readmemd)
 
-    ### CREATE PROJECT FILES
+        if supervisor != '':
+            docs.write(f'-    Project supervised by: {supervisor}', readmemd)
 
-    command = f'{SCRIPT} '
-    for arg in sys.argv[1:]:
-        if arg.startswith('-'):
-            command += f'{arg} '
-        else:
-            command += f'\'{arg}\' '
-
-    # writing major readme file
-    write(f'# Project \'{project_name}\' created on {time} from {author}.', readmemd, readmesh)
-    write(f'# with {SCRIPT} version {VERSION}.', readmesh)
-    write(f'# Used the following command in {os.getcwd()}', readmesh)
-    write(command, readmesh)
-
-    if activeParams['latex']:
-        latex(project_name=project_name,
-              project_dir=project_dir,
-              project_description=project_description,
-              organization=organization,
-              author=author,
-              orcid=orcid,
-              supervisor=supervisor,
-              bibList=bibList)
-
-    # add files to commit for git
-    if projectInput['git']:
-        files = []
-        for file in readmes.values():
-            files.append(file.split(os.path.join(project_dir, ''))[1])
-        # files = list(readmes.values())
-        print(files)
-        repo.index.add(files)
-        repo.index.commit(f'initial commit of {project_name} with {SCRIPT} {VERSION}')
-        log(f'Added {len(files)} files to git commit.')
+        if organization != '':
+            docs.write(f'-    Project developed at: {organization}', readmemd)
+
+        writeDirDescription(docs, project_name, template.directories, readmemd)
+
+        if activeParams['specs']:
+            docs.write('\n' + results['specs'], readmemd)
+
+        # data sections in fixed order
+        if trainlink is not None or vallink is not None:
+            docs.write('# Data to be analyzed:', readmemd)
+            for name in ('traindata', 'valdata'):
+                if name in results:
+                    docs.extend(results[name])
+                    docs.write('', readmemd)
+        elif datalink is not None:
+            docs.write('\n# Data to be analyzed:', readmemd)
+            docs.extend(results['data'])
+            log('Done linking resources/data.')
+        elif splitlink is not None:
+            docs.write('\n# Data to be analyzed:', readmemd)
+            docs.extend(results['split'])
+
+        docs.write(f'# References', readmemd)
+        for doi in doiList:
+            docs.write(f'-   [{doi}](http://doi.org/{doi})', readmemd)
+    
+        docs.write(f'\n# Protocol\n## {date.split(" ")[0]}', readmemd)
+        with PROFILE.phase('write'):
+            try:
+                written = docs.flush()
+            finally:
+                if bibFile is not None:
+                    bibFile.close()
+        log(f'Created {readmemd} and {readmesh}')
+
+        # stage all generated files in one index write, commit and push once
+        tracked = None
+        if projectInput['git']:
+            with PROFILE.phase('commit'):
+                files = [os.path.relpath(file, project_dir) for file in written + list(indexes.values())]
+                repo.index.add(files)
+                # counted after staging, the READMEs of ignored directories are only in the index
+                tracked = trackedSize(repo)
+                repo.index.commit(f'initial commit of {project_name} with {SCRIPT} {VERSION}')
+            log(f'Added {len(files)} files to git commit.')
+            log(f'git tracks {tracked[0]} files with {humanbytes(tracked[1])} in {project_dir}')
+            if gitMaxSize > 0 and tracked[1] > gitMaxSize:
+                warn(f'git tracks {humanbytes(tracked[1])}, more than {humanbytes(gitMaxSize)}! Add patterns with -i/--gitignore to keep large files out of git.', warnings)
+
+            with PROFILE.phase('push'):
+                for info in repo.remote('origin').push():
+                    if info.flags & info.ERROR:
+                        error(f'Cannot push to {giturl}: {info.summary.strip()}', 20)
+            log(f'Pushed files to {giturl}.')
+    except BaseException:
+        # project_dir was created by this call, a failure must not leave a half built project behind
+        import shutil
+
+        log(f'Removing the incomplete project {project_dir}')
+        shutil.rmtree(project_dir, ignore_errors=True)
+        raise
+
+    return ProjectResult(project_dir=project_dir,
+                         project_name=project_name,
+                         files=written,
+                         linked=linked,
+                         dois=doiList,
+                         bibtex=bibtexs,
+                         warnings=warnings,
+                         seconds=time.monotonic() - start,
+                         tracked=tracked,
+                         splits=splits)
+
+def main():
 
-    if projectInput['git']:
-        write(f'# Using git {giturl} for version control on account {git_user_name} on {git_service}.', readmesh)
-        write(f'-    Using git {giturl} for version control on account {git_user_name} on {git_service}.', readmemd)
+    log(f'STARTING {SCRIPT}')
 
-    write(f'-    Created with {SCRIPT} version {VERSION} from https://github.com/JannesSP/sciProTools.', readmemd)
-    write(f'<pre>\n{command}\n</pre>', readmemd)
+    args = parse_args(sys.argv[1:])
 
-    if orcid != '':
-        write(f'-    ORCID of the author: https://orcid.org/{orcid}', readmemd)
+    if args.profile is not None or args.profile_dump is not None:
+        import atexit
 
-    if supervisor != '':
-        write(f'-    Project supervised by: {supervisor}', readmemd)
+        # written at exit, also if the script stops with an error
+        if args.profile_dump is not None:
+            PROFILE.startProfile()
+        atexit.register(PROFILE.write, args.profile, args.profile_dump)
 
-    if organization != '':
-        write(f'-    Project developed at: {organization}', readmemd)
+    try:
+        warnings = 0
+        if args.batch is not None:
+            with PROFILE.phase('batch'):
+                failed, warnings = runBatch(args, sys.argv[1:])
+            if failed > 0:
+                log(f'Exit {SCRIPT} with {warnings} WARNINGS')
+                error(f'{failed} projects of {args.batch} failed!', 19)
+
+        elif args.verify is not None:
+            checkJobs(args)
+            if not os.path.isdir(args.verify):
+                error(f'Path {args.verify} does not exist!', 2)
+            with PROFILE.phase('verify'):
+                failed = verifyProject(args.verify, hash_jobs=args.hash_jobs, rehash=args.rehash)
+            if failed > 0:
+                log(f'Exit {SCRIPT} with {warnings} WARNINGS')
+                error(f'{failed} linked files are missing or modified!', 16)
+
+        elif args.sync:
+            checkJobs(args)
+            if args.project is None or not os.path.isdir(args.project.replace(' ', '_')):
+                error(f'--sync can only be used with an existing project given by -p/--project!', 15)
+            with PROFILE.phase('sync'):
+                syncProject(args.project.replace(' ', '_'), jobs=args.jobs, hash_jobs=args.hash_jobs, readme_limits=readmeLimits(args))
 
-    writeDirDescription(project_name, readmemd)
+        else:
+            warnings = len(createProject(args, sys.argv[1:]).warnings)
+
+    except CreateProError as e:
+        sys.stderr.write(f'ERROR: {e}\n')
+        sys.exit(e.code)
 
-    if activeParams['specs']:
-        write('\n' + getSpecs(), readmemd)
-
-    # if no datalink provided create train and validate data folders
-    if trainlink is not None or vallink is not None:
-        os.makedirs(os.path.join(project_dir, 'res' , 'traindata'))
-        log(f'Created {os.path.join(project_dir, "res" , "traindata")}')
-        os.makedirs(os.path.join(project_dir, 'res', 'valdata'))
-        log(f'Created {os.path.join(project_dir, "res", "valdata")}')
-        write('# Data to be analyzed:', readmemd)
-        
-        if trainlink is not None:
-            write(f'Resources/Data linked from<br>\n{os.path.abspath(trainlink)}<br>', readmemd)
-            (files, folders, datasize) = linkAllFiles(project_dir=project_dir, readmemd=readmemd, walkpath=trainlink, dst=os.path.join(project_dir, 'res', 'traindata'))
-            log(f'Linked traindata: {files} files in {folders} folders.')
-            log(f'Linked traindata of size {humanbytes(datasize)}')
-            write(f'Linked traindata: {files} files in {folders} folders with a total datasize of {humanbytes(datasize)}.<br>\n', readmemd)
-
-        if vallink is not None:
-            write(f'Resources/Data linked from<br>\n{os.path.abspath(vallink)}<br>', readmemd)
-            (files, folders, datasize) = linkAllFiles(project_dir=project_dir, readmemd=readmemd, walkpath=vallink, dst=os.path.join(project_dir, 'res', 'valdata'))
-            log(f'Linked validationdata: {files} files in {folders} folders.')
-            log(f'Linked validationdata of size {humanbytes(datasize)}')
-            write(f'Linked validationdata: {files} files in {folders} folders with a total datasize of {humanbytes(datasize)}.<br>\n', readmemd)
-
-    # linking data
-    elif datalink is not None:
-        write('\n# Data to be analyzed:', readmemd)
-        write(f'Resources/Data linked from<br>\n{os.path.abspath(datalink)}<br>', readmemd)
-        (files, folders, datasize) = linkAllFiles(project_dir=project_dir, readmemd=readmemd, walkpath=datalink, dst=os.path.join(project_dir, 'res'))
-        log(f'Linked {files} files in {folders} folders.')
-        write(f'Linked {files} files in {folders} folders with a total datasize of {humanbytes(datasize)}.', readmemd)
-        log(f'Linked data of size {humanbytes(datasize)}')
-        log('Done linking resources/data.')
-
-    # push commits to git remote
-    if projectInput['git']:
-        repo.remote("origin").push()
-        log(f'Pushed files to {giturl}.')
-
-    write(f'# References', readmemd)
-    for doi in doiList:
-        write(f'-   [{doi}](http://doi.org/{doi})', readmemd)
-    
-    write(f'\n# Protocol\n## {time.split(" ")[0]}', readmemd)
-    log(f'Created {readmemd} and {readmesh}')
     log(f'Exit {SCRIPT} with {warnings} WARNINGS')
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -1,26 +1,28 @@
 import os
 import sys
+import time
+import threading
 import argparse as ap
+from collections import deque
+from sciProUtils import log, hashFile, writeAtomic, Documents, Profiler
 
-VERSION = '0.1'
+VERSION = '0.2'
 SCRIPT = __file__
 SCRIPTPATH = os.path.dirname(os.path.abspath(SCRIPT))
 warnings = 0
+PLOT_FORMATS = ('.pdf', '.png', '.jpg', '.jpeg', '.eps')
+PLOT_BATCH = 256
+INDEX_DIR = '.createPro'
+PLOT_QUEUE = 8
+WATCH_DEBOUNCE = 1.0
+WATCH_INTERVAL = 5.0
+WATCH_MAX_DELAY = 30.0
 
 def error(string, error_type=1):
     sys.stderr.write(f'ERROR: {string}\n')
     sys.exit(error_type)
 
-def log(string, newline_before=False):
-    if newline_before:
-        sys.stderr.write('\n')
-    sys.stderr.write(f'LOG: {string}\n')
-
-def write(string, *files):
-    for file in files:
-        with open(file, 'a+') as w:
-            w.write(string + '\n')
-        w.close()
+PROFILE = Profiler(SCRIPT, VERSION)
 
 def parse_args(args):
 
@@ -37,82 +39,571 @@ def parse_args(args):
     docfilegroup.add_argument('-t', '--latex', action='store_true', default=False, help='Include plots into doc/attachments.tex file.')
     parser.add_argument('-pr', '--project', required=True, metavar='PROJECT_PATH', default='./', help='Path to a sciProTools project.')
 
+    parser.add_argument('-j', '--jobs', metavar='N', default=1, type=int, help='Number of threads scanning the top level subdirectories of the plots directory in parallel, useful on network filesystems. Default is 1.')
+    parser.add_argument('--rescan', action='store_true', default=False, help='Check every plot for changes, also in directories with unchanged mtime. Needed to notice plots overwritten in place.')
+    parser.add_argument('--no_index', action='store_true', default=False, help=f'Include all plots again, without reading and writing the index of included plots in PROJECT_PATH/{INDEX_DIR}.')
+    parser.add_argument('-w', '--watch', action='store_true', default=False, help='Keep running after the plots are included and append new plots to the documentation file as soon as they are written, stop with Ctrl+C. Uses inotify on Linux and scans the plots directory regularly on other systems.')
+    parser.add_argument('--debounce', metavar='SECONDS', default=WATCH_DEBOUNCE, type=float, help=f'Seconds without new writes before a burst of new plots is appended at once with --watch. Default is {WATCH_DEBOUNCE}.')
+    parser.add_argument('--poll', metavar='SECONDS', nargs='?', const=WATCH_INTERVAL, default=None, type=float, help=f'Scan the plots directory every SECONDS seconds with --watch instead of using inotify, e.g. on network filesystems that do not report remote writes. Default is {WATCH_INTERVAL}.')
+    parser.add_argument('--profile', metavar='REPORT.json', default=None, type=str, help='Write a JSON report with the wall time of every phase, the number of included plots and the peak RSS.')
+    parser.add_argument('--profile_dump', metavar='FILE.prof', default=None, type=str, help='Profile the run with cProfile and write the stats to FILE.prof, readable with pstats or snakeviz.')
+
     parser.add_argument('-v', '--version', action='version', version=f'\n%(prog)s {VERSION}')
 
-    return parser.parse_args()
+    return parser.parse_args(args)
 
-def getPlots(plot_dir, plotlist = []):
-    '''Traverse plot_dir and return a list of all files.
+def checkPlotExt(file, formats=PLOT_FORMATS):
+    '''Check if file has an accepted plot format and return a boolean.
     
     Keyword arguments:
-    plot_dir -- Path to traverse for files
-    plotlist -- List of all found files in plot_dir'''
-    # walk files and link them
-    entry = next(os.walk(plot_dir))
+    file -- File to check for format
+    formats -- Accepted plot extensions'''
+    return os.path.splitext(file)[1] in formats
 
-    for file in entry[2]:
-        plotlist.append(file)
+def walkPlots(plot_dir, formats=PLOT_FORMATS, recursive=True, stop=None):
+    '''Walk plot_dir iteratively with os.scandir and yield the paths of all plots depth first, sorted by name.
 
-    # walk directories
-    for dir in entry[1]:
-        return plotlist.extend(getPlots(dir))
-        
-    return plotlist
+    Only files with an extension in formats are yielded, symbolic links to directories are not followed.
+    The walk ends before the next directory is scanned once the threading.Event stop is set.'''
+    stack = [plot_dir]
+    while stack:
+        if stop is not None and stop.is_set():
+            return
+        directory = stack.pop()
+        plots = []
+        dirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif checkPlotExt(entry.name, formats) and entry.is_file():
+                    plots.append(entry.name)
+        plots.sort()
+        for plot in plots:
+            yield os.path.join(directory, plot)
+        if recursive:
+            # push in reverse to visit subdirectories in sorted order
+            for name in sorted(dirs, reverse=True):
+                stack.append(os.path.join(directory, name))
+
+class PlotIndex:
+    '''Index of the plots already included into a documentation file.
+
+    Every directory is stored with its mtime, its subdirectories and its plots with mtime, size and BLAKE2b checksum.
+    A directory with unchanged mtime has no added, removed or renamed entries, so walk only stats it and
+    uses the stored subdirectories and plots. Plots overwritten in place do not change the mtime of their directory,
+    use rescan to check every plot.
 
-def checkPlotExt(file):
-    '''Check if file has an accepted plot format and return a boolean.
-    
     Keyword arguments:
-    file -- File to check for format'''
-    acceptedplotformats = ['.pdf', '.png', '.jpg', '.jpeg', '.eps']
-    if not os.path.splitext(file)[1] in acceptedplotformats:
+    file -- Path of the index, read if it exists
+    rescan -- Check every plot, also in unchanged directories'''
+
+    def __init__(self, file, rescan=False):
+        self.file = file
+        self.rescan = rescan
+        self.old = {}
+        self.dirs = {}
+        self.stats = {'new': 0, 'changed': 0, 'unchanged': 0, 'skipped_dirs': 0, 'scanned_dirs': 0}
+        self.lock = threading.Lock()
+        if os.path.isfile(file):
+            self.read()
+
+    def read(self):
+        plots = None
+        with open(self.file, 'r') as r:
+            for line in r:
+                fields = line.rstrip('\n').split('\t')
+                if fields[0] == 'd':
+                    plots = {}
+                    self.old[fields[1]] = (int(fields[2]), [name for name in fields[3].split('/') if name != ''], plots)
+                elif fields[0] == 'f':
+                    plots[fields[1]] = (int(fields[2]), int(fields[3]), fields[4])
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
+
+    def walk(self, plot_dir, formats=PLOT_FORMATS, recursive=True, rescan=None, stop=None):
+        '''Walk plot_dir like walkPlots and yield only plots that are not in the index yet.
+
+        Changed plots are updated in the index but not yielded, their entry in the documentation file shows the new content.
+        rescan overrides the rescan setting of the index for this walk.'''
+        if rescan is None:
+            rescan = self.rescan
+        stack = [plot_dir]
+        while stack:
+            if stop is not None and stop.is_set():
+                return
+            directory = stack.pop()
+            absdir = os.path.abspath(directory)
+            mtime = os.stat(directory).st_mtime_ns
+            old = self.old.get(absdir)
+
+            if old is not None and old[0] == mtime and not rescan:
+                # no entries were added, removed or renamed
+                self.dirs[absdir] = old
+                self.count('skipped_dirs')
+                self.count('unchanged', len(old[2]))
+                dirs = old[1]
+            else:
+                self.count('scanned_dirs')
+                oldplots = old[2] if old is not None else {}
+                plots = {}
+                new = []
+                dirs = []
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        elif checkPlotExt(entry.name, formats) and entry.is_file():
+                            stat = entry.stat()
+                            previous = oldplots.get(entry.name)
+                            if previous is not None and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+                                plots[entry.name] = previous
+                                self.count('unchanged')
+                                continue
+                            digest = hashFile(entry.path)
+                            plots[entry.name] = (stat.st_mtime_ns, stat.st_size, digest)
+                            if previous is None:
+                                new.append(entry.name)
+                                self.count('new')
+                            elif previous[2] != digest:
+                                log(f'Updated {entry.path}')
+                                self.count('changed')
+                            else:
+                                self.count('unchanged')
+                dirs.sort()
+                self.dirs[absdir] = (mtime, dirs, plots)
+                for name in sorted(new):
+                    yield os.path.join(directory, name)
+
+            if recursive:
+                # push in reverse to visit subdirectories in sorted order
+                for name in reversed(dirs):
+                    stack.append(os.path.join(directory, name))
+
+    def forget(self, directory):
+        '''Drop the absolute path directory and all directories below it, e.g. after it was removed.'''
+        prefix = os.path.join(directory, '')
+        for path in [path for path in self.dirs if path == directory or path.startswith(prefix)]:
+            del self.dirs[path]
+
+    def write(self, plot_dir):
+        '''Write the index, directories outside of plot_dir are kept, removed directories below plot_dir are dropped.'''
+        root = os.path.abspath(plot_dir)
+        dirs = dict((path, record) for path, record in self.old.items() if path != root and not path.startswith(os.path.join(root, '')))
+        dirs.update(self.dirs)
+        if dirs == self.old:
+            return False
+
+        lines = []
+        for path in sorted(dirs):
+            mtime, subdirs, plots = dirs[path]
+            lines.append(f'd\t{path}\t{mtime}\t{"/".join(subdirs)}\n')
+            for name in sorted(plots):
+                lines.append(f'f\t{name}\t{plots[name][0]}\t{plots[name][1]}\t{plots[name][2]}\n')
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        writeAtomic(self.file, ''.join(lines), append=False)
+        self.old = dirs
+        return True
+
+def getPlots(plot_dir, jobs=1, formats=PLOT_FORMATS, walk=walkPlots):
+    '''Traverse plot_dir and yield the paths of all plots in a stable order.
+
+    With jobs > 1 the top level subdirectories are walked by jobs threads in parallel.
+    Every thread hands its plots over in batches through a bounded queue, so memory stays constant for any number of plots.
+    If the consumer stops early, the threads stop before their next directory and are joined.
+
+    Keyword arguments:
+    plot_dir -- Path to traverse for plots
+    jobs -- Number of threads walking the top level subdirectories
+    formats -- Accepted plot extensions
+    walk -- Function walking a directory like walkPlots with its stop argument, e.g. PlotIndex.walk'''
+    if jobs <= 1:
+        yield from walk(plot_dir, formats)
+        return
+
+    import queue
+
+    yield from walk(plot_dir, formats, recursive=False)
+    with os.scandir(plot_dir) as entries:
+        subdirs = sorted(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+
+    done = object()
+    stop = threading.Event()
+
+    def put(plots, item):
+        '''Put item into plots and return False if the consumer stopped meanwhile.'''
+        while not stop.is_set():
+            try:
+                plots.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
         return False
-    return True
 
-def writeLatex(file, plot, project):
+    def scan(subdir, plots):
+        try:
+            batch = []
+            for plot in walk(subdir, formats, stop=stop):
+                batch.append(plot)
+                if len(batch) >= PLOT_BATCH:
+                    if not put(plots, batch):
+                        return
+                    batch = []
+            put(plots, batch)
+        except Exception as e:
+            put(plots, e)
+        put(plots, done)
+
+    # walkers run at most jobs subdirectories ahead, their plots are yielded in the order of the subdirectories
+    running = deque()
+    threads = []
+    pending = iter(subdirs)
+    try:
+        while True:
+            while len(running) < jobs:
+                subdir = next(pending, None)
+                if subdir is None:
+                    break
+                plots = queue.Queue(PLOT_QUEUE)
+                threads.append(threading.Thread(target=scan, args=(subdir, plots), daemon=True))
+                threads[-1].start()
+                running.append(plots)
+            if not running:
+                break
+
+            plots = running.popleft()
+            while True:
+                batch = plots.get()
+                if batch is done:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield from batch
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+class Inotify:
+    '''Minimal ctypes binding of the Linux inotify API, watching directories for added, removed and written entries.
+
+    Raises OSError if inotify is not available, e.g. on other systems than Linux.'''
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_ISDIR = 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR | IN_DONT_FOLLOW
+
+    def __init__(self):
+        # imported here, ctypes is only needed for --watch
+        import ctypes
+        import ctypes.util
+
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self.libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError(f'inotify is not available on {sys.platform}')
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            self.raiseErrno()
+        self.paths = {}
+        self.wds = {}
+
+    def raiseErrno(self, path=None):
+        import ctypes
+
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), path)
+
+    def add(self, directory):
+        '''Watch the absolute path directory and return False if the limit of watches is reached.
+
+        A directory removed in the meantime is skipped.'''
+        import errno
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            try:
+                self.raiseErrno(directory)
+            except (FileNotFoundError, NotADirectoryError):
+                return True
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    return False
+                raise
+        # a directory moved inside the watched tree keeps its watch descriptor
+        self.paths.pop(self.wds.get(wd), None)
+        self.paths[directory] = wd
+        self.wds[wd] = directory
+        return True
+
+    def remove(self, directory):
+        wd = self.paths.pop(directory)
+        del self.wds[wd]
+        # fails if the kernel already dropped the watch of a removed directory
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout=None):
+        '''Wait at most timeout seconds for events and return them as list of (directory, mask, name) tuples.
+
+        directory is None for events without watch, e.g. IN_Q_OVERFLOW.'''
+        import select
+        import struct
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = struct.unpack_from('iIII', data, offset)
+            name = os.fsdecode(data[offset + 16:offset + 16 + length].rstrip(b'\0'))
+            offset += 16 + length
+            if mask & self.IN_IGNORED:
+                directory = self.wds.pop(wd, None)
+                if directory is not None and self.paths.get(directory) == wd:
+                    del self.paths[directory]
+                continue
+            events.append((self.wds.get(wd), mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+def watchPlots(index, plot_dir, include, debounce=WATCH_DEBOUNCE, interval=WATCH_INTERVAL, poll=False):
+    '''Watch plot_dir for new plots until interrupted and hand every batch of new plots to include.
+
+    With inotify every directory of plot_dir is watched. A burst of events is collected until no event arrived
+    for debounce seconds, but at most WATCH_MAX_DELAY seconds, then only the directories with events are scanned.
+    Without inotify, e.g. on other systems or with poll, plot_dir is scanned every interval seconds
+    and unchanged directories are skipped by their mtime.
+
+    Keyword arguments:
+    index -- PlotIndex holding all directories of plot_dir, e.g. after a walk over plot_dir
+    plot_dir -- Path to watch for plots
+    include -- Function taking an iterable of new plots, writing them into the documentation file and the index
+    debounce -- Seconds without events before a batch of plots is included
+    interval -- Seconds between two scans without inotify
+    poll -- Scan every interval seconds also if inotify is available, e.g. on network filesystems'''
+    root = os.path.abspath(plot_dir)
+    inotify = None
+    limit = False
+    if not poll:
+        try:
+            inotify = Inotify()
+            limit = not all(inotify.add(directory) for directory in sorted(index.dirs))
+        except OSError as e:
+            log(f'Cannot watch {plot_dir} with inotify ({e}), scanning every {interval} seconds instead.')
+            if inotify is not None:
+                inotify.close()
+            inotify = None
+
+    def watch(directory):
+        nonlocal limit
+        if not inotify.add(directory):
+            limit = True
+
+    def resync():
+        # full scan, catches also plots written while the watches were added
+        index.dirs = {}
+        include(index.walk(root))
+        if inotify is not None:
+            for directory in set(inotify.paths) - set(index.dirs):
+                inotify.remove(directory)
+            for directory in sorted(set(index.dirs) - set(inotify.paths)):
+                watch(directory)
+
+    def scan(dirty):
+        stack = sorted(dirty, reverse=True)
+        while stack:
+            directory = stack.pop()
+            previous = index.dirs.get(directory)
+            # watch new directories before they are scanned, later plots trigger an event
+            if directory not in inotify.paths:
+                watch(directory)
+            try:
+                plots = list(index.walk(directory, recursive=False, rescan=True))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            yield from plots
+            subdirs = index.dirs[directory][1]
+            if previous is not None:
+                for name in set(previous[1]) - set(subdirs):
+                    path = os.path.join(directory, name)
+                    index.forget(path)
+                    for watched in [watched for watched in inotify.paths if watched == path or watched.startswith(os.path.join(path, ''))]:
+                        inotify.remove(watched)
+            for name in reversed(subdirs):
+                path = os.path.join(directory, name)
+                if path not in inotify.paths:
+                    stack.append(path)
+
+    resync()
+    try:
+        while True:
+            if limit:
+                log(f'Reached the limit of inotify watches, scanning every {interval} seconds instead. Increase fs.inotify.max_user_watches to watch {plot_dir}.')
+                inotify.close()
+                inotify = None
+                limit = False
+            if inotify is None:
+                time.sleep(interval)
+                resync()
+                continue
+
+            events = inotify.read()
+            dirty = set()
+            full = False
+            first = time.monotonic()
+            deadline = first + debounce
+            while True:
+                for directory, mask, name in events:
+                    if mask & inotify.IN_Q_OVERFLOW or (mask & inotify.IN_ISDIR and mask & inotify.IN_MOVED_FROM):
+                        # lost events or a moved directory, the watched paths are outdated
+                        full = True
+                    elif directory is not None:
+                        dirty.add(directory)
+                now = time.monotonic()
+                if events:
+                    deadline = min(now + debounce, first + max(WATCH_MAX_DELAY, debounce))
+                if now >= deadline:
+                    break
+                events = inotify.read(deadline - now)
+
+            if full:
+                resync()
+            elif dirty:
+                include(scan(dirty))
+    finally:
+        if inotify is not None:
+            inotify.close()
+
+def writeLatex(docs, file, plot, project):
     '''Write tex file to include plot.'''
-    with open(file, 'a') as tex:
-        tex.write('\t\\begin{figure}[H]\n' + 
-                  '\t\t\\centering\n' + 
-                  '\t\t\\includegraphics[width=\\textwidth]{' + f'{plot}' + '}\n' +
-                  f'\t\t\\caption[{os.path.splitext(plot.split("/")[-1])[0].replace("_", " ")}]' + '{' + f'{os.path.splitext(plot.split("/")[-1])[0].replace("_", " ")}' + '}\n' + 
-                  '\t\t\\label{fig:' + f'{os.path.splitext(plot.split("/")[-1])[0]}' + '}\n' + 
-                  '\t\\end{figure}\n\n')
-    tex.close()
-
-def writeMarkdown(file, plot, project):
+    docs.write('\t\\begin{figure}[H]\n' + 
+               '\t\t\\centering\n' + 
+               '\t\t\\includegraphics[width=\\textwidth]{' + f'{plot}' + '}\n' +
+               f'\t\t\\caption[{os.path.splitext(plot.split("/")[-1])[0].replace("_", " ")}]' + '{' + f'{os.path.splitext(plot.split("/")[-1])[0].replace("_", " ")}' + '}\n' + 
+               '\t\t\\label{fig:' + f'{os.path.splitext(plot.split("/")[-1])[0]}' + '}\n' + 
+               '\t\\end{figure}\n', file)
+
+def writeMarkdown(docs, file, plot, project):
     '''Write md file to include plot.'''
-    with open(file, 'a') as md:
-        md.write(f'## {plot.split("/")[-1]}\n![]({plot})\n')
-    md.close()
+    docs.write(f'## {plot.split("/")[-1]}\n![]({plot})', file)
+
+def renderPlots(docs, plots, docfile, project):
+    '''Write all plots into the buffered documentation file and return their number.'''
+    if docfile['tex']:
+        file = os.path.join(project, "doc", "attachments.tex")
+        if not os.path.exists(file):
+            error(f'File {file} does not exist!', 2)
+        write = writeLatex
+    elif docfile['md']:
+        file = os.path.join(project, "README.md")
+        if not os.path.exists(file):
+            error(f'File {file} does not exist!', 3)
+        write = writeMarkdown
+
+    rendered = 0
+    for plot in plots:
+        log(f'Include {plot} to {project}.')
+        write(docs, file, os.path.abspath(plot), project)
+        rendered += 1
+    return rendered
 
 def main():
 
     args = parse_args(sys.argv[1:])
 
+    if args.profile is not None or args.profile_dump is not None:
+        import atexit
+
+        # written at exit, also if the script stops with an error
+        if args.profile_dump is not None:
+            PROFILE.startProfile()
+        atexit.register(PROFILE.write, args.profile, args.profile_dump)
+
     docfile = {'md': args.markdown, 'tex': args.latex}
     plotdir = args.plots
     project = args.project
+    docs = Documents()
 
     if not os.path.exists(project):
         error(f'Path {project} does not exist!', 1)
 
-    for plot in getPlots(plotdir):
-        if checkPlotExt(plot):
-            log(f'Include {plot} to {project}.')
-
-            if docfile['tex']:
-                if os.path.exists(os.path.join(project, "doc", "attachments.tex")):
-                    writeLatex(os.path.join(project, "doc", "attachments.tex"), os.path.abspath(plot), project)
-                else:
-                    error(f'File {os.path.join(project, "doc", "attachments.tex")} does not exist!', 2)
-
-            elif docfile['md']:
-                if os.path.exists(os.path.join(project, "README.md")):
-                    writeMarkdown(os.path.join(project, "README.md"), os.path.abspath(plot), project)
-                else:
-                    error(f'File {os.path.join(project, "README.md")} does not exist!', 3)
-
-log(f'STARTING {SCRIPT}')
-main()
-log(f'EXIT {SCRIPT} with {warnings} warnings.')
\ No newline at end of file
+    if args.jobs < 1:
+        error(f'Number of jobs has to be at least 1!', 4)
+
+    if not os.path.isdir(plotdir):
+        error(f'Path {plotdir} is not a directory!', 5)
+
+    if args.watch and args.no_index:
+        error(f'--watch needs the index of included plots and cannot be used with --no_index!', 6)
+
+    if args.debounce < 0 or (args.poll is not None and args.poll <= 0):
+        error(f'--debounce has to be at least 0 and --poll has to be positive!', 7)
+
+    index = None
+    walk = walkPlots
+    if not args.no_index:
+        docname = 'attachments.tex' if docfile['tex'] else 'README.md'
+        index = PlotIndex(os.path.join(project, INDEX_DIR, f'plots_{docname}.tsv'), rescan=args.rescan)
+        walk = index.walk
+
+    # plots are rendered while the tree is scanned
+    with PROFILE.phase('scan'):
+        rendered = renderPlots(docs, getPlots(plotdir, jobs=args.jobs, walk=walk), docfile, project)
+    PROFILE.count('plots_included', rendered)
+
+    with PROFILE.phase('write'):
+        docs.flush()
+        if index is not None:
+            index.write(plotdir)
+
+    if args.watch:
+        import signal
+
+        def include(plots):
+            # Ctrl+C waits until the documentation file and the index are both written
+            mask = hasattr(signal, 'pthread_sigmask')
+            if mask:
+                signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGINT, signal.SIGTERM})
+            try:
+                with PROFILE.phase('watch'):
+                    rendered = renderPlots(docs, plots, docfile, project)
+                    # the file was written completely before, only the new lines are appended
+                    docs.flush(inplace=True)
+                    index.write(plotdir)
+            finally:
+                if mask:
+                    signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGINT, signal.SIGTERM})
+            PROFILE.count('plots_included', rendered)
+            if rendered > 0:
+                log(f'Appended {rendered} new plots.')
+
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        log(f'Watching {plotdir} for new plots, stop with Ctrl+C.')
+        try:
+            watchPlots(index, plotdir, include, debounce=args.debounce, interval=args.poll or WATCH_INTERVAL, poll=args.poll is not None)
+        except KeyboardInterrupt:
+            log('Stopped watching.')
+
+    if index is not None:
+        for key, value in index.stats.items():
+            PROFILE.count(key, value)
+        log(f'Included {index.stats["new"]} new plots, {index.stats["changed"]} changed and {index.stats["unchanged"]} unchanged plots are already included. Skipped {index.stats["skipped_dirs"]} unchanged directories.')
+
+if __name__ == '__main__':
+    log(f'STARTING {SCRIPT}')
+    main()
+    log(f'EXIT {SCRIPT} with {warnings} warnings.')
\ No newline at end of file
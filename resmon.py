@@ -0,0 +1,421 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import json
+import math
+import struct
+import shutil
+import threading
+import argparse as ap
+from datetime import datetime
+from sciProUtils import log, humanbytes, writeAtomic
+
+VERSION = '0.1'
+SCRIPT = __file__
+SCRIPTPATH = os.path.dirname(os.path.abspath(SCRIPT))
+warnings = 0
+INTERVAL = 1.0
+GPU_INTERVAL = 10.0
+MAX_OVERHEAD = 0.01
+FLUSH_RECORDS = 60
+MAGIC = b'RESMON 1\n'
+# time, CPU of the monitored processes in percent of one core, RSS, cumulative disk I/O, system CPU, GPU load, GPU memory in MB, cumulative monitor CPU
+COLUMNS = (('time', 'd'), ('cpu', 'f'), ('rss', 'Q'), ('read_bytes', 'Q'), ('write_bytes', 'Q'), ('system_cpu', 'f'), ('gpu_load', 'f'), ('gpu_memory', 'f'), ('monitor_cpu', 'd'))
+RECORD = struct.Struct('<' + ''.join(code for name, code in COLUMNS))
+NUMPY_TYPES = {'d': '<f8', 'f': '<f4', 'Q': '<u8'}
+
+def error(string, error_type=1):
+    sys.stderr.write(f'ERROR: {string}\n')
+    sys.exit(error_type)
+
+def warn(string):
+    global warnings
+    sys.stderr.write(f'WARNING: {string}\n')
+    warnings += 1
+
+class Monitor:
+    '''Record CPU, RSS and disk I/O of processes and all their children, the system CPU and the GPUs in a background thread.
+
+    Every sample is appended to file as fixed size record of COLUMNS after a JSON header, see readRecording.
+    The thread measures its own CPU time. If a sample costs more than half of MAX_OVERHEAD of the interval,
+    the interval is doubled, so the monitor stays below MAX_OVERHEAD of one core. GPUs are sampled less often,
+    GPUtil starts nvidia-smi for every sample.
+
+    Keyword arguments:
+    file -- Path of the recording, e.g. PROJECT/out/resmon_<date>.bin
+    pids -- Processes to monitor together with their children, default is this process
+    interval -- Seconds between two samples
+    gpu_interval -- Seconds between two GPU samples, 0 disables GPUs
+    command -- Description of the monitored processes written into the header'''
+
+    def __init__(self, file, pids=None, interval=INTERVAL, gpu_interval=GPU_INTERVAL, command=''):
+        # imported here, psutil is only needed while recording
+        import psutil
+
+        self.psutil = psutil
+        self.file = file
+        self.processes = [psutil.Process(pid) for pid in (pids if pids is not None else [os.getpid()])]
+        self.interval = interval
+        self.gpu_interval = gpu_interval
+        self.command = command
+        self.stopping = threading.Event()
+        self.thread = None
+        self.error = None
+
+    def start(self):
+        '''Write the header of the recording and start sampling.'''
+        header = {'version': VERSION,
+                  'columns': [name for name, code in COLUMNS],
+                  'struct': RECORD.format,
+                  'numpy_dtype': [[name, NUMPY_TYPES[code]] for name, code in COLUMNS],
+                  'interval': self.interval,
+                  'gpu_interval': self.gpu_interval,
+                  'start': datetime.now().isoformat(timespec='seconds'),
+                  'host': os.uname().nodename,
+                  'pids': [process.pid for process in self.processes],
+                  'command': self.command}
+        os.makedirs(os.path.dirname(os.path.abspath(self.file)), exist_ok=True)
+        self.writer = open(self.file, 'xb')
+        self.writer.write(MAGIC + json.dumps(header).encode('utf-8') + b'\n')
+        self.writer.flush()
+        self.thread = threading.Thread(target=self.run, name='resmon', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        '''Take a last sample, stop sampling and close the recording.'''
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def totals(self):
+        '''Return (cpu seconds, rss, read bytes, write bytes) of all monitored processes and their children.'''
+        psutil = self.psutil
+        processes = []
+        for process in self.processes:
+            try:
+                processes.append(process)
+                processes.extend(process.children(recursive=True))
+            except psutil.NoSuchProcess:
+                pass
+
+        cpu = 0.0
+        rss = 0
+        read = 0
+        write = 0
+        for process in processes:
+            try:
+                with process.oneshot():
+                    # reaped children are counted by their parent
+                    times = process.cpu_times()
+                    cpu += times.user + times.system + times.children_user + times.children_system
+                    rss += process.memory_info().rss
+                    if hasattr(process, 'io_counters'):
+                        io = process.io_counters()
+                        read += io.read_bytes
+                        write += io.write_bytes
+            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+                continue
+        return (cpu, rss, read, write)
+
+    def gpus(self):
+        '''Return (load in percent, memory in MB) over all GPUs, or None without GPUs.'''
+        # GPUtil looks for nvidia-smi at a fixed path on Windows
+        if sys.platform != 'win32' and shutil.which('nvidia-smi') is None:
+            log('Found no nvidia-smi, recording without GPUs.')
+            return None
+        try:
+            # imported here, GPUtil is only needed for GPUs
+            import GPUtil
+
+            gpus = GPUtil.getGPUs()
+        except Exception as e:
+            log(f'Cannot sample GPUs ({e}), recording without GPUs.')
+            return None
+        if len(gpus) == 0:
+            log('Found no GPUs, recording without GPUs.')
+            return None
+        return (sum(gpu.load for gpu in gpus) / len(gpus) * 100, sum(gpu.memoryUsed for gpu in gpus))
+
+    def run(self):
+        try:
+            self.sample()
+        except BaseException as e:
+            self.error = e
+
+    def sample(self):
+        psutil = self.psutil
+        start = time.monotonic()
+        monitor = time.thread_time()
+        psutil.cpu_percent(interval=None)
+        lastcpu = self.totals()[0]
+        last = start
+        nextgpu = start if self.gpu_interval > 0 else math.inf
+        buffer = []
+
+        while True:
+            stopping = self.stopping.wait(self.interval)
+            begin = time.thread_time()
+            now = time.monotonic()
+            cpu, rss, read, write = self.totals()
+            system = psutil.cpu_percent(interval=None)
+
+            gpucost = 0.0
+            load = (math.nan, math.nan)
+            if now >= nextgpu:
+                # nvidia-smi runs in a child process, its wall time counts as cost
+                gpubegin = time.monotonic()
+                gpu = self.gpus()
+                gpucost = time.monotonic() - gpubegin
+                monitor -= gpucost
+                if gpu is None:
+                    nextgpu = math.inf
+                else:
+                    load = gpu
+                    if gpucost > MAX_OVERHEAD / 2 * self.gpu_interval:
+                        self.gpu_interval *= 2
+                        log(f'Sampling GPUs every {self.gpu_interval} seconds to stay below {MAX_OVERHEAD:.0%} CPU.')
+                    nextgpu = now + self.gpu_interval
+
+            # cpu time of exited, not yet reaped children is lost, their usage is not negative
+            percent = max(0.0, cpu - lastcpu) / max(now - last, 1e-9) * 100
+            lastcpu = cpu
+            last = now
+            buffer.append(RECORD.pack(now - start, percent, rss, read, write, system, load[0], load[1], time.thread_time() - monitor))
+            if len(buffer) >= FLUSH_RECORDS or stopping:
+                self.writer.write(b''.join(buffer))
+                self.writer.flush()
+                buffer = []
+            if stopping:
+                return
+
+            cost = time.thread_time() - begin
+            if cost > MAX_OVERHEAD / 2 * self.interval:
+                self.interval *= 2
+                log(f'Sampling every {self.interval} seconds to stay below {MAX_OVERHEAD:.0%} CPU.')
+
+def readRecording(file):
+    '''Return (header, records) of a recording, records is a generator of dictionaries of COLUMNS.
+
+    A record cut off at the end, e.g. by a crash, is skipped.
+    The records can also be read with numpy.fromfile(file, dtype=[tuple(column) for column in header['numpy_dtype']], offset=header['offset']).'''
+    with open(file, 'rb') as r:
+        if r.readline() != MAGIC:
+            raise ValueError(f'{file} is not a recording of {os.path.basename(SCRIPT)}')
+        header = json.loads(r.readline())
+        header['offset'] = r.tell()
+    if header['struct'] != RECORD.format:
+        raise ValueError(f'{file} was recorded with the unknown record format {header["struct"]}')
+
+    def records():
+        names = header['columns']
+        with open(file, 'rb') as r:
+            r.seek(header['offset'])
+            while True:
+                chunk = r.read(RECORD.size * 4096)
+                chunk = chunk[:len(chunk) - len(chunk) % RECORD.size]
+                if len(chunk) == 0:
+                    return
+                for record in RECORD.iter_unpack(chunk):
+                    yield dict(zip(names, record))
+
+    return (header, records())
+
+def summarize(file):
+    '''Return averages and peaks of a recording as dictionary, averages are weighted by the time between samples.'''
+    header, records = readRecording(file)
+    summary = {'header': header, 'samples': 0, 'duration': 0.0, 'monitor_cpu': 0.0,
+               'cpu_average': 0.0, 'cpu_peak': 0.0, 'rss_average': 0.0, 'rss_peak': 0,
+               'read_bytes': 0, 'write_bytes': 0, 'read_peak': 0.0, 'write_peak': 0.0,
+               'system_cpu_average': 0.0, 'system_cpu_peak': 0.0,
+               'gpu_load_average': math.nan, 'gpu_load_peak': math.nan, 'gpu_memory_peak': math.nan}
+    last = None
+    gpus = []
+    for record in records:
+        summary['samples'] += 1
+        dt = record['time'] - (last['time'] if last is not None else 0.0)
+        summary['cpu_average'] += record['cpu'] * dt
+        summary['rss_average'] += record['rss'] * dt
+        summary['system_cpu_average'] += record['system_cpu'] * dt
+        summary['cpu_peak'] = max(summary['cpu_peak'], record['cpu'])
+        summary['rss_peak'] = max(summary['rss_peak'], record['rss'])
+        summary['system_cpu_peak'] = max(summary['system_cpu_peak'], record['system_cpu'])
+        if last is not None and dt > 0:
+            # counters of exited processes are lost, only increases are counted
+            for column in ('read_bytes', 'write_bytes'):
+                delta = max(0, record[column] - last[column])
+                summary[column] += delta
+                peak = column.split('_')[0] + '_peak'
+                summary[peak] = max(summary[peak], delta / dt)
+        if not math.isnan(record['gpu_load']):
+            gpus.append(record['gpu_load'])
+            summary['gpu_memory_peak'] = record['gpu_memory'] if math.isnan(summary['gpu_memory_peak']) else max(summary['gpu_memory_peak'], record['gpu_memory'])
+        summary['duration'] = record['time']
+        summary['monitor_cpu'] = record['monitor_cpu']
+        last = record
+
+    if summary['duration'] > 0:
+        for column in ('cpu_average', 'rss_average', 'system_cpu_average'):
+            summary[column] /= summary['duration']
+    if len(gpus) > 0:
+        summary['gpu_load_average'] = sum(gpus) / len(gpus)
+        summary['gpu_load_peak'] = max(gpus)
+    summary['overhead'] = summary['monitor_cpu'] / summary['duration'] if summary['duration'] > 0 else 0.0
+    return summary
+
+def renderSummary(summary, file, project):
+    '''Return the markdown table of a summary from summarize for the protocol of README.md.'''
+    header = summary['header']
+    duration = summary['duration']
+    # the command is shown in one line of inline code
+    command = ' '.join(header['command'].replace('`', "'").split()) if header['command'] != '' else f'PIDs {", ".join(map(str, header["pids"]))}'
+    lines = [f'### Resources of `{command}`',
+             f'Recorded {summary["samples"]} samples from {header["start"].replace("T", " ")} for {time.strftime("%H:%M:%S", time.gmtime(duration))} on {header["host"]} into {os.path.relpath(file, project)}, monitor overhead {summary["overhead"]:.3%} CPU.<br>',
+             '',
+             '| Resource | Average | Peak |',
+             '|---|---|---|',
+             f'| CPU (100% = one core) | {summary["cpu_average"]:.1f}% | {summary["cpu_peak"]:.1f}% |',
+             f'| RAM (RSS) | {humanbytes(summary["rss_average"])} | {humanbytes(summary["rss_peak"])} |',
+             f'| Disk read, total {humanbytes(summary["read_bytes"])} | {humanbytes(summary["read_bytes"] / duration if duration > 0 else 0)}/s | {humanbytes(summary["read_peak"])}/s |',
+             f'| Disk write, total {humanbytes(summary["write_bytes"])} | {humanbytes(summary["write_bytes"] / duration if duration > 0 else 0)}/s | {humanbytes(summary["write_peak"])}/s |',
+             f'| System CPU | {summary["system_cpu_average"]:.1f}% | {summary["system_cpu_peak"]:.1f}% |']
+    if not math.isnan(summary['gpu_load_average']):
+        lines.append(f'| GPU load | {summary["gpu_load_average"]:.1f}% | {summary["gpu_load_peak"]:.1f}% |')
+        lines.append(f'| GPU memory | | {humanbytes(summary["gpu_memory_peak"] * 1024 ** 2)} |')
+    return '\n'.join(lines) + '\n'
+
+def appendProtocol(readme, string):
+    '''Append string to the end of the Protocol section of readme, the section is added if it is missing.'''
+    with open(readme, 'r') as r:
+        lines = r.read().splitlines(keepends=True)
+    if len(lines) > 0 and not lines[-1].endswith('\n'):
+        lines[-1] += '\n'
+
+    protocol = next((i for i, line in enumerate(lines) if line.rstrip('\n') == '# Protocol'), None)
+    if protocol is None:
+        lines.append('\n# Protocol\n')
+        end = len(lines)
+    else:
+        # the section ends at the next top level heading
+        end = next((i for i in range(protocol + 1, len(lines)) if lines[i].startswith('# ')), len(lines))
+    lines.insert(end, string)
+    writeAtomic(readme, ''.join(lines), append=False)
+
+def parse_args(args):
+
+    parser = ap.ArgumentParser(
+        description=f'{SCRIPT} records CPU, RAM, disk I/O and GPU usage of your analysis into the out directory of a sciProTools project and adds a summary to the protocol of README.md.',
+        formatter_class=ap.HelpFormatter,
+        epilog=f'You are currently using {SCRIPT} version {VERSION}!'
+    )
+
+    parser.add_argument('-pr', '--project', required=True, metavar='PROJECT_PATH', help='Path to a sciProTools project.')
+    parser.add_argument('-p', '--pid', metavar='PID', action='append', default=[], type=int, help='Monitor the running process PID and its children until they exit or Ctrl+C, can be given several times.')
+    parser.add_argument('-s', '--summary', metavar='RECORDING.bin', default=None, type=str, help='Only add the summary of an existing recording to README.md.')
+    parser.add_argument('-i', '--interval', metavar='SECONDS', default=INTERVAL, type=float, help=f'Seconds between two samples. The interval is doubled if a sample needs more than {MAX_OVERHEAD / 2:.1%}% of it in CPU time, to stay below {MAX_OVERHEAD:.0%}% CPU. Default is {INTERVAL}.')
+    parser.add_argument('--gpu_interval', metavar='SECONDS', default=GPU_INTERVAL, type=float, help=f'Seconds between two GPU samples, every GPU sample starts nvidia-smi. Use 0 to disable GPUs. Default is {GPU_INTERVAL}.')
+    parser.add_argument('-o', '--output', metavar='RECORDING.bin', default=None, type=str, help='Path of the recording. Default is PROJECT_PATH/out/resmon_<date>.bin.')
+    parser.add_argument('--no_readme', action='store_true', default=False, help='Do not add the summary to README.md.')
+    parser.add_argument('command', nargs=ap.REMAINDER, metavar='-- COMMAND', help='Command to run and monitor, e.g. -- python3 analysis.py.')
+
+    parser.add_argument('-v', '--version', action='version', version=f'\n%(prog)s {VERSION}')
+
+    args = parser.parse_args(args)
+    if len(args.command) > 0 and args.command[0] == '--':
+        args.command = args.command[1:]
+    return args
+
+def main():
+
+    args = parse_args(sys.argv[1:])
+    project = args.project
+    readme = os.path.join(project, 'README.md')
+
+    if not os.path.exists(project):
+        error(f'Path {project} does not exist!', 1)
+
+    if not args.no_readme and not os.path.isfile(readme):
+        error(f'File {readme} does not exist!', 2)
+
+    if sum([len(args.command) > 0, len(args.pid) > 0, args.summary is not None]) != 1:
+        error(f'Give exactly one of a command, -p/--pid or -s/--summary!', 3)
+
+    if args.interval <= 0 or args.gpu_interval < 0:
+        error(f'Interval has to be positive and GPU interval at least 0!', 4)
+
+    returncode = 0
+    recording = args.summary
+    if recording is None:
+        import signal
+        import subprocess
+        import psutil
+
+        recording = args.output
+        if recording is None:
+            recording = os.path.join(project, 'out', f'resmon_{datetime.now().strftime("%Y%m%d_%H%M%S")}.bin')
+
+        if len(args.command) > 0:
+            process = subprocess.Popen(args.command)
+            pids = [process.pid]
+            command = ' '.join(args.command)
+            # the command stops first, the monitor takes its last sample afterwards
+            signal.signal(signal.SIGTERM, lambda signum, frame: process.terminate())
+        else:
+            pids = args.pid
+            command = ''
+
+        try:
+            monitor = Monitor(recording, pids=pids, interval=args.interval, gpu_interval=args.gpu_interval, command=command)
+        except psutil.NoSuchProcess as e:
+            error(f'Process {e.pid} does not exist!', 5)
+        log(f'Recording {command if command != "" else "PIDs " + ", ".join(map(str, pids))} into {recording}')
+        with monitor:
+            while True:
+                try:
+                    if len(args.command) > 0:
+                        returncode = process.wait()
+                        # like a shell, a command stopped by a signal returns 128 + signal
+                        if returncode < 0:
+                            returncode = 128 - returncode
+                    else:
+                        psutil.wait_procs(monitor.processes)
+                    break
+                except KeyboardInterrupt:
+                    # the command got Ctrl+C as well, wait until it stopped
+                    if len(args.command) == 0:
+                        break
+        log(f'Stopped recording {recording}')
+
+    try:
+        summary = summarize(recording)
+    except (OSError, ValueError) as e:
+        error(f'Cannot read recording {recording}: {e}', 6)
+    if summary['overhead'] > MAX_OVERHEAD:
+        warn(f'Monitor overhead of {summary["overhead"]:.3%} CPU exceeded {MAX_OVERHEAD:.0%}, use a larger -i/--interval.')
+    log(f'CPU average {summary["cpu_average"]:.1f}%, peak {summary["cpu_peak"]:.1f}%; RSS peak {humanbytes(summary["rss_peak"])}; monitor overhead {summary["overhead"]:.3%} CPU.')
+
+    if not args.no_readme:
+        appendProtocol(readme, renderSummary(summary, recording, project))
+        log(f'Added summary of {recording} to {readme}')
+
+    return returncode
+
+if __name__ == '__main__':
+    log(f'STARTING {SCRIPT}')
+    returncode = main()
+    log(f'EXIT {SCRIPT} with {warnings} warnings.')
+    sys.exit(returncode)
@@ -0,0 +1,276 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# helpers shared by createPro.py, plindocs.py and resmon.py
+
+import os
+import sys
+import time
+import threading
+from datetime import datetime
+
+HASH_CHUNK = 1024 ** 2
+
+def log(string, newline_before=False):
+    if newline_before:
+        sys.stderr.write('\n')
+    sys.stderr.write(f'LOG: {string}\n')
+
+def humanbytes(B):
+    '''Return the given bytes as a human friendly KB, MB, GB, or TB string'''
+    B = float(B)
+    KB = float(1024)
+    MB = float(KB ** 2) # 1,048,576
+    GB = float(KB ** 3) # 1,073,741,824
+    TB = float(KB ** 4) # 1,099,511,627,776
+
+    if B < KB:
+        return '{0} {1}'.format(B,'Bytes' if 0 == B > 1 else 'Byte')
+    elif KB <= B < MB:
+        return '{0:.4f} KB'.format(B/KB)
+    elif MB <= B < GB:
+        return '{0:.4f} MB'.format(B/MB)
+    elif GB <= B < TB:
+        return '{0:.4f} GB'.format(B/GB)
+    elif TB <= B:
+        return '{0:.4f} TB'.format(B/TB)
+
+def hashFile(path, buffer=None):
+    '''Return the BLAKE2b hex digest of file path, read in chunks of the size of buffer.'''
+    import hashlib
+
+    digest = hashlib.blake2b()
+    if buffer is None:
+        buffer = bytearray(HASH_CHUNK)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as r:
+        while True:
+            size = r.readinto(buffer)
+            if size == 0:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+def writeContent(w, content):
+    '''Write content to the file object w, a string or a list of strings and open files that are copied from their start.'''
+    if isinstance(content, str):
+        w.write(content)
+        return
+    import shutil
+
+    for piece in content:
+        if isinstance(piece, str):
+            w.write(piece)
+        else:
+            piece.seek(0)
+            shutil.copyfileobj(piece, w)
+
+def writeAtomic(file, string, append=True):
+    '''Write string to file through a temporary file that replaces file in a single rename.
+
+    The mode of an existing file is kept. If file has more than one hard link and append is set,
+    string is appended in place with appendFile instead, a rename would split the links.
+
+    Keyword arguments:
+    file -- Path of the file to write
+    string -- Content to write, a string or a list of strings and open files, see writeContent
+    append -- Keep the current content of file in front of string'''
+    import shutil
+
+    exists = os.path.exists(file)
+    if append and exists and os.stat(file).st_nlink > 1:
+        appendFile(file, string)
+        return
+    tmp = f'{file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp, 'x') as w:
+            if append and exists:
+                with open(file, 'r') as r:
+                    shutil.copyfileobj(r, w)
+            writeContent(w, string)
+        if exists:
+            shutil.copymode(file, tmp)
+        os.replace(tmp, file)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def appendFile(file, string):
+    '''Append string to file in place and sync it to disk.
+
+    Unlike writeAtomic the current content is not copied, so repeated small appends to a large file stay cheap.'''
+    with open(file, 'a') as w:
+        writeContent(w, string)
+        w.flush()
+        os.fsync(w.fileno())
+
+class Documents:
+    '''Collect the content of all generated documents in memory and write every file once.'''
+
+    def __init__(self):
+        self.buffers = {}
+
+    def write(self, string, *files):
+        '''Append string as a new line to the buffers of files.'''
+        for file in files:
+            self.buffers.setdefault(file, []).append(string + '\n')
+
+    def append(self, piece, *files):
+        '''Append a string or an open file to the buffers of files without a newline.
+
+        Open files are not read into memory, their content is copied from their start when the documents are flushed.'''
+        for file in files:
+            self.buffers.setdefault(file, []).append(piece)
+
+    def extend(self, other):
+        '''Append all buffers of the Documents other.'''
+        for file, lines in other.buffers.items():
+            self.buffers.setdefault(file, []).extend(lines)
+
+    def flush(self, inplace=False):
+        '''Write all buffered documents to disk, one atomic write per file, and return the written files.
+
+        With inplace the buffers are appended to the files with appendFile instead of an atomic rewrite.'''
+        files = list(self.buffers.keys())
+        for file in files:
+            pieces = self.buffers[file]
+            content = ''.join(pieces) if all(isinstance(piece, str) for piece in pieces) else pieces
+            if inplace:
+                appendFile(file, content)
+            else:
+                writeAtomic(file, content)
+        self.buffers.clear()
+        return files
+
+class Profiler:
+    '''Measure the wall time of phases, count expensive operations and write a JSON report.
+
+    Counters are always collected, they are updated once per batch or request.
+    Phases running more than once, e.g. in several projects created at the same time,
+    are summed up with the number of calls. All updates are guarded by a lock.
+    startProfile additionally collects cProfile stats for a dump.
+
+    Keyword arguments:
+    script -- Path of the script the report is written for
+    version -- Version of the script'''
+
+    def __init__(self, script, version):
+        self.script = script
+        self.version = version
+        self.start = time.monotonic()
+        self.phases = {}
+        self.counters = {}
+        self.profiles = []
+        self.profile = None
+        self.cprofile = False
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def phase(self, name):
+        '''Return a context manager measuring the phase name.'''
+        return ProfilePhase(self, name)
+
+    def startProfile(self):
+        '''Collect cProfile stats until the report is written.
+
+        Since Python 3.12 a profiler sees all threads, one profiler records the whole run. Before, a profiler
+        only sees the thread that enabled it, every phase is profiled in the thread running it then.
+        If another profiler is already active no stats are collected.'''
+        import cProfile
+
+        if sys.version_info < (3, 12):
+            self.cprofile = True
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            log(f'Cannot collect cProfile stats: {e}')
+            return
+        self.profile = profile
+
+    def report(self):
+        import resource
+
+        # ru_maxrss is given in KiB on Linux and in bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return {
+            'script': os.path.basename(self.script),
+            'version': self.version,
+            'argv': sys.argv[1:],
+            'host': os.uname().nodename,
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'wall_seconds': round(time.monotonic() - self.start, 6),
+            'phases': self.phases,
+            'counters': self.counters,
+            'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            'peak_rss_children_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+        }
+
+    def write(self, file, dump=None):
+        '''Write the JSON report to file and the merged cProfile stats to dump.'''
+        import json
+
+        if self.profile is not None:
+            self.profile.disable()
+            self.profiles.append(self.profile)
+            self.profile = None
+        if file is not None:
+            writeAtomic(file, json.dumps(self.report(), indent=2) + '\n', append=False)
+            log(f'Wrote profile report to {file}')
+        if dump is not None and len(self.profiles) > 0:
+            import pstats
+
+            stats = pstats.Stats(*self.profiles)
+            stats.dump_stats(dump)
+            log(f'Wrote cProfile stats to {dump}')
+
+class ProfilePhase:
+    '''Context manager recording start, end and duration of a phase in a Profiler.
+
+    Before Python 3.12 the phase is profiled in its thread if cProfile stats are collected,
+    phases inside a profiled phase of the same thread are part of the outer profile.'''
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.profile = None
+
+    def __enter__(self):
+        if self.profiler.cprofile and not getattr(self.profiler.local, 'profiling', False):
+            import cProfile
+
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+            self.profiler.local.profiling = True
+        self.begin = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.monotonic()
+        if self.profile is not None:
+            self.profile.disable()
+            self.profiler.local.profiling = False
+        with self.profiler.lock:
+            phase = self.profiler.phases.get(self.name)
+            if phase is None:
+                self.profiler.phases[self.name] = {
+                    'start': round(self.begin - self.profiler.start, 6),
+                    'end': round(end - self.profiler.start, 6),
+                    'seconds': round(end - self.begin, 6),
+                    'calls': 1,
+                    'failed': exc[0] is not None,
+                }
+            else:
+                phase['end'] = max(phase['end'], round(end - self.profiler.start, 6))
+                phase['seconds'] = round(phase['seconds'] + end - self.begin, 6)
+                phase['calls'] += 1
+                phase['failed'] = phase['failed'] or exc[0] is not None
+            if self.profile is not None:
+                self.profiler.profiles.append(self.profile)
+        return False